@@ -1,28 +1,17 @@
 import os
-import json
 from datetime import datetime
 from flask import Flask, redirect, url_for, current_app
-from app.config_paths import CONFIG_FILE
 from zoneinfo import ZoneInfo
+from app.utils.config_store import user_config
 from dateutil import parser  # still useful for parsing arbitrary strings
 
 
 def load_user_config():
-    if os.path.exists(CONFIG_FILE):
-        with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
-    return {
-        "latitude": None,
-        "longitude": None,
-        "altitude_m": None,
-        "timezone": None,
-        "theme": "auto"
-    }
+    return user_config.get()
 
 
 def save_user_config(data):
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    user_config.update(data)
 
 
 def datetimeformat(value, format="%Y-%m-%d %H:%M", tz: str | None = None):
@@ -43,15 +32,20 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object("app.config.Config")
 
-    # Load user config into app.config
-    user_cfg = load_user_config()
-    app.config.update(
-        LATITUDE=user_cfg["latitude"],
-        LONGITUDE=user_cfg["longitude"],
-        ALTITUDE_M=user_cfg["altitude_m"],
-        TIMEZONE=user_cfg["timezone"],
-        THEME=user_cfg.get("theme", "auto")
-    )
+    # Load user config into app.config, and keep it in sync when the file
+    # changes (config page, settings import, or another process)
+    def apply_user_config(user_cfg, old=None):
+        app.config.update(
+            LATITUDE=user_cfg.get("latitude"),
+            LONGITUDE=user_cfg.get("longitude"),
+            ALTITUDE_M=user_cfg.get("altitude_m"),
+            TIMEZONE=user_cfg.get("timezone"),
+            THEME=user_cfg.get("theme", "auto")
+        )
+
+    apply_user_config(load_user_config())
+    user_config.subscribe(apply_user_config)
+    user_config.watch()
 
     # Ensure TLE directory exists
     tle_dir = os.path.join(app.root_path, "static", "tle")
@@ -1,23 +1,9 @@
 from flask import render_template, request, current_app, jsonify
 from timezonefinder import TimezoneFinder
-from app.config_paths import CONFIG_FILE
-import json
-import os
+from app.utils.config_store import settings as settings_store, user_config
 from datetime import datetime
-from pathlib import Path
 from . import bp
 
-SETTINGS_FILE = Path("settings.json")  # diagnostics calibration file
-
-def load_diag_settings():
-    """Load diagnostics settings (rtl_ppm), defaulting to {} if missing."""
-    if SETTINGS_FILE.exists():
-        try:
-            return json.loads(SETTINGS_FILE.read_text())
-        except Exception:
-            return {}
-    return {}
-
 @bp.route("/", methods=["GET", "POST"], endpoint="config_page")
 def config_page():
     if request.method == "POST":
@@ -63,7 +49,6 @@ def config_page():
         current_app.config["THEME"] = theme
 
         # Save to config file
-        os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
         saved = {
             "latitude": current_app.config.get("LATITUDE"),
             "longitude": current_app.config.get("LONGITUDE"),
@@ -71,24 +56,16 @@ def config_page():
             "timezone": current_app.config.get("TIMEZONE"),
             "theme": theme
         }
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(saved, f, indent=2)
+        user_config.update(saved)
 
         return jsonify({**saved, "saved_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
 
-    # GET: load current settings from file if present
-    settings = {}
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE) as f:
-                settings = json.load(f)
-        except Exception:
-            settings = {}
+    # GET: current settings from the shared config store
+    settings = user_config.get()
 
     # Merge in rtl_ppm from diagnostics settings.json
-    diag_settings = load_diag_settings()
     try:
-        ppm = int(diag_settings.get("rtl_ppm", 0))
+        ppm = int(settings_store.get("rtl_ppm", 0))
     except (ValueError, TypeError):
         ppm = 0
     settings["rtl_ppm"] = ppm
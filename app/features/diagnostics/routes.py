@@ -1,28 +1,27 @@
-import os, json, shutil, subprocess, psutil, datetime, time
+import os, json, shutil, subprocess, datetime, time, threading, tempfile
 from pathlib import Path
 from flask import render_template, jsonify, request, current_app, redirect, url_for, flash
-from app.utils.iq_cleanup import cleanup_orphan_iq
+from app.utils.iq_cleanup import cleanup_orphan_iq, is_orphan
 from app.features.diagnostics import bp
-from app.utils import passes as passes_utils
+from app.utils import pass_store, scheduler_control
+from app.utils.config_store import settings as settings_store
+from app.utils.sdr import DevicePool
 from app.utils.decoder import process_uploaded_wav
+from app.utils import capture_writer
+from app.utils.waterfall import Waterfall
 
 # --- Paths & constants ---
 STATE_FILE     = Path.home() / "sstv-groundstation/current_pass.json"
 RECORDINGS_DIR = Path("recordings")
-SETTINGS_FILE  = Path("settings.json")
 IMAGES_DIR     = Path("images")
 LOW_SPACE_GB   = 2
 MANUAL_DIR     = RECORDINGS_DIR / "manual"
 MANUAL_DIR.mkdir(parents=True, exist_ok=True)
+MANUAL_ACTIVE  = threading.Event()  # set while the manual recorder holds the dongle
 
 # --- Settings helpers ---
-def load_settings():
-    return json.loads(SETTINGS_FILE.read_text()) if SETTINGS_FILE.exists() else {}
-
-def save_settings(s): SETTINGS_FILE.write_text(json.dumps(s, indent=2))
-
 def get_ppm():
-    try: return int(load_settings().get("rtl_ppm", 0))
+    try: return int(settings_store.get("rtl_ppm", 0))
     except (ValueError, TypeError): return 0
 
 # --- System checks ---
@@ -48,23 +47,18 @@ def sdr_device_connected():
 
 
 def sdr_in_use():
-    for proc in psutil.process_iter(['name','cmdline']):
-        try:
-            if (proc.info['name'] and 'rtl_fm' in proc.info['name']) or \
-               (proc.info['cmdline'] and any('rtl_fm' in c for c in proc.info['cmdline'])):
-                return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied): continue
-    return False
+    """A manual recording here, or a capture the scheduler reports over its control socket."""
+    if MANUAL_ACTIVE.is_set(): return True
+    reply = scheduler_control.send_command("status")
+    return bool(reply and reply.get("captures"))
 
 def scheduled_pass_soon(minutes=5):
     try:
         now = datetime.datetime.now(datetime.timezone.utc)
-        for p in passes_utils.load_predictions():
-            aos = datetime.datetime.fromisoformat(p['aos'])
-            if now <= aos <= now + datetime.timedelta(minutes=minutes):
-                return True
-    except Exception: pass
-    return False
+        upcoming = pass_store.next_passes(1, after=now)
+        return bool(upcoming) and upcoming[0]["start"] <= now + datetime.timedelta(minutes=minutes)
+    except Exception:
+        return False
 
 # --- Routes ---
 @bp.route("/")
@@ -93,8 +87,9 @@ def diagnostics_status():
         except Exception as e:
             pass_info = {"error": f"Could not read pass state: {e}"}
 
+    current = (pass_info or {}).get("iq_file") or ""
     for f in RECORDINGS_DIR.glob("*.iq"):
-        if not pass_info or str(f) != pass_info.get("iq_file"):
+        if is_orphan(f, current):
             entry = {"path": str(f), "size_mb": round(f.stat().st_size/(1024*1024), 2)}
             if free_gb < LOW_SPACE_GB:
                 try: os.remove(f); entry["deleted"] = True
@@ -149,14 +144,20 @@ def calibrate():
         ppm = int(round(((best_freq-expected)/expected)*1e6))
         ppm = max(min(ppm, 3000), -3000)
 
-        settings = load_settings(); settings["rtl_ppm"] = ppm; save_settings(settings)
+        settings_store.update(rtl_ppm=ppm)
 
         def nf_capture(label, ppm_arg=None):
             rate, png = 48000, IMAGES_DIR / f"calibration_{label}.png"
             ppm_opts = ["-p", str(ppm_arg)] if ppm_arg is not None else []
-            cmd = f"timeout 8 rtl_fm -f {expected} -M fm -s {rate} -g 29.7 -l 0 {' '.join(ppm_opts)} " \
-                  f"| sox -t raw -r {rate} -e signed -b 16 -c 1 - -n spectrogram -o {png}"
-            subprocess.run(cmd, shell=True, check=True)
+            # Waterfall built from the stream as it is recorded, no sox pass over the file
+            waterfall = Waterfall(rate)
+            with tempfile.TemporaryDirectory() as tmp:
+                capture_writer.record(
+                    ["rtl_fm", "-f", str(expected), "-M", "fm", "-s", str(rate), "-g", "29.7", "-l", "0", *ppm_opts],
+                    Path(tmp) / "nf.wav", rate, 8, taps=[waterfall]
+                )
+            if not waterfall.save(png):
+                raise RuntimeError(f"rtl_fm produced no audio for the {label} capture")
             return png.name
 
         return jsonify({
@@ -178,6 +179,13 @@ def sdr_status():
     if scheduled_pass_soon(): return jsonify({"status": "amber"})
     return jsonify({"status": "green"})
 
+@bp.route("/sdr/devices")
+def sdr_devices():
+    """Connected dongles with the PPM correction each capture would use."""
+    pool = DevicePool()
+    pool.refresh()
+    return jsonify({"devices": [{**d, "ppm": pool.ppm(d)} for d in pool.devices()]})
+
 # --- System checks (add this above your routes) ---
 def sdr_device_connected():
     """Returns True only if rtl_test -t actually finds a dongle."""
@@ -248,24 +256,17 @@ def manual_recorder():
         flash(f"Writing REAL to: {wav_file.resolve()}", "info")
 
         with open(log_file, "w") as lf:
+            MANUAL_ACTIVE.set()
             try:
-                p1 = subprocess.Popen(
+                # rtl_fm's PCM is written straight to the WAV, no sox in between
+                capture_writer.record(
                     ["rtl_fm","-M","fm","-f",freq,"-p",ppm_arg,"-s",SAMPLE_RATE,"-g","40"],
-                    stdout=subprocess.PIPE, stderr=lf
-                )
-                p2 = subprocess.Popen(
-                    ["sox","-t","raw","-r",SAMPLE_RATE,"-e","s16","-b","16","-c","1","-",
-                     str(wav_file)],
-                    stdin=p1.stdout, stderr=lf
+                    wav_file, int(SAMPLE_RATE), duration, log_file=lf
                 )
-                p1.stdout.close()
-                p2.wait(timeout=duration + 5)
-            except subprocess.TimeoutExpired:
-                p1.terminate(); p2.terminate()
-                flash("Recording timed out", "danger")
+            except OSError as e:
+                flash(f"Recording failed: {e}", "danger")
             finally:
-                if p1.poll() is None: p1.terminate()
-                if p2.poll() is None: p2.terminate()
+                MANUAL_ACTIVE.clear()
 
         # soxi analysis & decode...
         # (keep your existing soxi + process_uploaded_wav here)
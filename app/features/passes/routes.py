@@ -1,12 +1,21 @@
+import io
+import math
 import os
-from datetime import datetime, timedelta, timezone
-from flask import render_template, current_app, jsonify
+from datetime import datetime
+from flask import render_template, current_app, jsonify, request, Response
 from zoneinfo import ZoneInfo
-import requests
 
 from . import bp
 from app.utils.sdr import rtl_sdr_present
-from app.utils.sdr_scheduler import load_pass_predictions, PASS_FILE, manual_refresh
+from app.utils.tle import downlink_hz
+from app.utils.tle_store import get_store
+from app.utils.refresh_service import submit_refresh, wait_for
+from app.utils.sdr_scheduler import capture_lead_s, STOP_LATE, ELEVATION_THRESHOLD, MIN_PEAK_ELEVATION
+from app.utils import pass_store, scheduler_control, passes as passes_utils
+from app.utils.pass_selection import select_passes
+from app.utils.elevation_gate import gate_passes
+
+MAX_NETWORK_HOURS = 168
 
 SSTV_SATELLITES = [
     {
@@ -22,19 +31,10 @@ def tle_file_path():
     return os.path.join(current_app.config["TLE_DIR"], "active.txt")
 
 def get_tle_age_days(tle_path):
-    """Return age of TLE file in days, or None if it can't be determined."""
+    """Return age of the file's first TLE epoch in days (from the TLE index), or None."""
     try:
-        with open(tle_path) as f:
-            lines = [line.strip() for line in f if line.strip()]
-        if len(lines) < 2:
-            return None
-        line1 = lines[1]
-        epoch_str = line1[18:32]  # YYDDD.DDDDDDDD
-        year = int(epoch_str[:2])
-        year += 2000 if year < 57 else 1900
-        day_of_year = float(epoch_str[2:])
-        epoch = datetime(year, 1, 1, tzinfo=timezone.utc) + timedelta(days=day_of_year - 1)
-        return (datetime.now(timezone.utc) - epoch).total_seconds() / 86400
+        ages = get_store(os.path.dirname(tle_path)).epoch_ages_days(tle_path)
+        return float(ages[0]) if len(ages) else None
     except Exception:
         return None
 
@@ -56,20 +56,14 @@ def passes_page():
             "age_days": get_tle_age_days(tle_path)
         }
 
-    # Load tuples and normalize into dicts for template
-    raw_passes = load_pass_predictions(PASS_FILE)
+    # Indexed pass store; convert to the display timezone for the template
+    zone = ZoneInfo(tz) if tz else None
     passes_list = [
-        {
-            "satellite": sat,
-            "start": aos,
-            "end": los,
-            "peak": aos + (los - aos) / 2,  # crude midpoint if peak not stored
-            "max_elevation": max_el
-        }
-        for sat, aos, los, max_el in raw_passes
+        {**p, **{k: p[k].astimezone(zone) for k in ("start", "peak", "end")}}
+        for p in pass_store.all_passes()
     ]
 
-    now_for_template = datetime.now(ZoneInfo(tz)) if tz else datetime.now()
+    now_for_template = datetime.now().astimezone(zone)
 
     return render_template(
         "passes/passes.html",
@@ -85,46 +79,127 @@ def passes_page():
 
 @bp.route("/update-tle", endpoint="update_tle")
 def update_tle():
-    try:
-        tle_dir = current_app.config["TLE_DIR"]
-        os.makedirs(tle_dir, exist_ok=True)
-        path = tle_file_path()
-
-        iss = SSTV_SATELLITES[0]
-        url = f"https://celestrak.org/NORAD/elements/gp.php?CATNR={iss['norad_id']}&FORMAT=TLE"
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        tle_lines = resp.text.strip().splitlines()
-
-        if len(tle_lines) >= 3:
-            with open(path, "w") as f:
-                f.write("\n".join(tle_lines[:3]) + "\n")
-
-        # Trigger a refresh of predictions after updating TLE
-        manual_refresh()
-        return jsonify({"status": "success", "updated": True})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)})
-
-@bp.route("/timeline")
-def timeline():
-    """Return current predicted passes as JSON for the frontend."""
-    raw_passes = load_pass_predictions(PASS_FILE)
-    passes_list = [
-        {
-            "satellite": sat,
-            "aos": aos.isoformat(),
-            "los": los.isoformat(),
-            "max_elevation": max_el
-        }
-        for sat, aos, los, max_el in raw_passes
-    ]
-    return jsonify(passes_list)
+    """Queue a TLE + prediction refresh; poll /passes/refresh/<job_id> for completion."""
+    os.makedirs(current_app.config["TLE_DIR"], exist_ok=True)
+    job = submit_refresh()
+    return jsonify({"status": "accepted", **job.to_dict()}), 202
+
+@bp.route("/refresh/<job_id>", endpoint="refresh_status")
+def refresh_status(job_id):
+    """Job status; `?wait=N` long-polls up to N seconds (max 30) for completion."""
+    wait = min(request.args.get("wait", 0, type=float), 30)
+    job = wait_for(job_id, wait)
+    if job is None:
+        return jsonify({"status": "error", "message": "Unknown job"}), 404
+    return jsonify(job.to_dict())
 
 @bp.route("/update-passes", methods=["POST"])
 def update_passes():
-    """Manual refresh of predictions (used by button)."""
-    manual_refresh()
-    refreshed = len(load_pass_predictions(PASS_FILE))
-    return jsonify({"success": True, "count": refreshed})
+    """
+    Manual refresh of predictions. Queued like /update-tle; the job nudges
+    a running scheduler to reschedule once the new passes are stored.
+    """
+    job = submit_refresh()
+    return jsonify({"success": True, **job.to_dict()}), 202
+
+@bp.route("/export.csv", endpoint="export_csv")
+def export_csv():
+    """Download the stored predictions in the legacy predicted_passes.csv format."""
+    out = io.StringIO()
+    pass_store.export_csv(out)
+    return Response(out.getvalue(), mimetype="text/csv",
+                    headers={"Content-Disposition": "attachment; filename=predicted_passes.csv"})
     
+
+@bp.route("/track/<int:pass_id>", endpoint="pass_track")
+def pass_track(pass_id):
+    """
+    Precomputed track of one pass for sky plots and ground tracks.
+    `?every=N` returns every Nth sample (default: all, ~1 s spacing).
+    """
+    p = pass_store.get_pass(pass_id)
+    track = pass_store.get_track(pass_id, p["satellite"], p["start"]) if p else None
+    if track is None:
+        return jsonify({"status": "error", "message": "Unknown pass"}), 404
+    every = max(1, request.args.get("every", 1, type=int))
+
+    def column(key, digits):
+        values = track[key][::every]
+        if values.size and math.isnan(values[0]):  # no downlink configured
+            return None
+        return [round(float(v), digits) for v in values]
+
+    return jsonify({
+        "id": p["id"],
+        "satellite": p["satellite"],
+        "start": p["start"].isoformat(),
+        "peak": p["peak"].isoformat(),
+        "end": p["end"].isoformat(),
+        "max_elevation": p["max_elevation"],
+        "t0": track["t0"],
+        "step_s": track["step"] * every,
+        "az": column("az", 2),
+        "el": column("el", 2),
+        "range_km": column("range_km", 1),
+        "range_rate_km_s": column("range_rate_km_s", 4),
+        "doppler_hz": column("doppler_hz", 0),
+        "lat": column("lat", 3),
+        "lon": column("lon", 3)
+    })
+
+@bp.route("/network", methods=["POST"], endpoint="network_passes")
+def network_passes():
+    """
+    Batched predictions for several stations. JSON body:
+    {"observers": [{"name", "latitude", "longitude", "altitude", "timezone"}, ...],
+     "hours": 48}
+    """
+    body = request.get_json(silent=True) or {}
+    observers = body.get("observers")
+    hours = body.get("hours", 48)
+    try:
+        if not observers or not isinstance(observers, list):
+            raise ValueError("observers must be a non-empty list")
+        names = [o["name"] for o in observers]
+        if len(set(names)) != len(names):
+            raise ValueError("observer names must be unique")
+        for o in observers:
+            float(o["latitude"]), float(o["longitude"]), float(o.get("altitude") or 0)
+            ZoneInfo(o.get("timezone") or "UTC")
+        hours = float(hours)
+        if not 0 < hours <= MAX_NETWORK_HOURS:
+            raise ValueError(f"hours must be in (0, {MAX_NETWORK_HOURS}]")
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid request: {e}"}), 400
+
+    network = passes_utils.generate_network_predictions(
+        observers, tle_file_path(), hours=hours, workers=passes_utils.prediction_workers()
+    )
+    return jsonify({
+        name: [{**p, **{k: p[k].isoformat() for k in ("start", "peak", "end")}} for p in passes]
+        for name, passes in network.items()
+    })
+
+@bp.route("/selection", endpoint="pass_selection")
+def pass_selection():
+    """
+    Which upcoming passes the scheduler will record on its SDRs, and why
+    others are dropped. The SDR count comes from the running scheduler's
+    device pool; without a scheduler one SDR is assumed.
+    """
+    def as_json(p):
+        return {**p, **{k: p[k].isoformat() for k in ("start", "peak", "end", "aos", "los") if k in p}}
+
+    # start/end of each pass are its elevation-gated recording window
+    recordable = [p for p in pass_store.next_passes(n=-1) if downlink_hz(p["satellite"])]
+    gated, below = gate_passes(recordable,
+                               min_elevation=ELEVATION_THRESHOLD, min_peak=MIN_PEAK_ELEVATION)
+    reply = scheduler_control.send_command("status")
+    devices = len(reply["devices"]) if reply and reply["ok"] else 1
+    selected, dropped = select_passes(gated, pad_before=capture_lead_s(), pad_after=STOP_LATE,
+                                      devices=max(1, devices))
+    dropped = sorted(below + dropped, key=lambda d: d["pass"]["start"])
+    return jsonify({
+        "selected": [as_json(p) for p in selected],
+        "dropped": [{**d, "pass": as_json(d["pass"])} for d in dropped]
+    })
@@ -1,59 +1,66 @@
-from flask import jsonify
+from flask import current_app, request
 from . import bp
 import os
 import json
-from app.utils.passes import generate_predictions
-from app import config_paths
+import hashlib
+from bisect import bisect_right
+from app.utils.passes import cached_predictions
 from zoneinfo import ZoneInfo
-from datetime import datetime
+from datetime import datetime, timezone
 
 STATE_FILE = os.path.expanduser("~/sstv-groundstation/current_pass.json")
 
-@bp.route("/timeline", methods=["GET"])
-def pass_timeline():
-    # Load config for location and timezone
+# Last rendered timeline, reused until predictions, pass statuses or the
+# current-pass state change
+_rendered = {"key": None, "body": None, "etag": None}
+
+def _current_pass_state():
+    """Return (mtime, current pass dict or None) from the scheduler's state file."""
     try:
-        with open(config_paths.CONFIG_FILE) as f:
-            cfg = json.load(f)
-        lat = cfg.get("latitude")
-        lon = cfg.get("longitude")
-        alt = cfg.get("altitude", 0)
-        tz = cfg.get("timezone", "UTC")
+        mtime = os.path.getmtime(STATE_FILE)
+        with open(STATE_FILE) as f:
+            return mtime, json.load(f)
     except Exception:
-        return jsonify({"error": "Could not load config"}), 500
+        return None, None
 
-    tle_path = "app/static/tle/active.txt"
-    passes = generate_predictions(lat, lon, alt, tz, tle_path)
-    now = datetime.now(ZoneInfo(tz))
+@bp.route("/timeline", methods=["GET"])
+def pass_timeline():
+    """
+    Predicted passes with upcoming / in_progress / completed status, read from
+    the prediction cache (no Skyfield work). Responses carry an ETag; pollers
+    sending If-None-Match get 304 until something changes.
+    """
+    tz = ZoneInfo(current_app.config.get("TIMEZONE") or "UTC")
+    version, passes = cached_predictions()
+    now = datetime.now(timezone.utc)
+    state_mtime, current_pass = _current_pass_state()
 
-    # Try to load current pass info
-    current_pass = None
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE) as f:
-                current_pass = json.load(f)
-        except Exception:
-            current_pass = None
+    # Statuses only change when a pass starts or ends, so the number of
+    # started and ended passes identifies the rendered state
+    started = bisect_right([p["start"] for p in passes], now)
+    ended = sum(1 for p in passes[:started] if p["end"] < now)
+    key = (version, started, ended, state_mtime, str(tz))
 
-    # Mark pass status for timeline
-    timeline = []
-    for p in passes:
-        status = "upcoming"
-        if p["start"] <= now <= p["end"]:
-            status = "in_progress"
-        elif p["end"] < now:
-            status = "completed"
-        timeline.append({
-            "satellite": p["satellite"],
-            "start": p["start"].isoformat(),
-            "end": p["end"].isoformat(),
-            "peak": p["peak"].isoformat(),
-            "max_elevation": p["max_elevation"],
-            "status": status
-        })
+    if key != _rendered["key"]:
+        timeline = []
+        for p in passes:
+            status = "upcoming"
+            if p["start"] <= now <= p["end"]:
+                status = "in_progress"
+            elif p["end"] < now:
+                status = "completed"
+            timeline.append({
+                "satellite": p["satellite"],
+                "start": p["start"].astimezone(tz).isoformat(),
+                "end": p["end"].astimezone(tz).isoformat(),
+                "peak": p["peak"].astimezone(tz).isoformat(),
+                "max_elevation": p["max_elevation"],
+                "status": status
+            })
+        body = json.dumps({"timeline": timeline, "current_pass": current_pass})
+        _rendered.update(key=key, body=body, etag=hashlib.sha1(body.encode()).hexdigest())
 
-    # Optionally, add current_pass if not in predictions
-    return jsonify({
-        "timeline": timeline,
-        "current_pass": current_pass
-    })
+    resp = current_app.response_class(_rendered["body"], mimetype="application/json")
+    resp.set_etag(_rendered["etag"])
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
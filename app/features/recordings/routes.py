@@ -4,64 +4,20 @@ import wave
 import subprocess
 import psutil
 import os
+import signal
 from pathlib import Path
 from flask import render_template, jsonify, send_from_directory, request
 from werkzeug.utils import secure_filename
 from collections import defaultdict
 from datetime import datetime
 from app.features.recordings import bp
-import app.utils.tle as tle_utils
-import app.utils.passes as passes_utils
 from app.utils.decoder import process_uploaded_wav
-from app import config_paths
+from app.utils.ephemeris_backfill import backfill
+from app.utils import scheduler_control
+from app.utils.config_store import settings as settings_store
 
 # ✅ Always resolve to the top-level recordings directory, regardless of CWD
 RECORDINGS_DIR = (Path(__file__).resolve().parent.parent.parent.parent / "recordings").resolve()
-SETTINGS_FILE = Path("settings.json")
-
-
-def load_settings():
-    if SETTINGS_FILE.exists():
-        return json.loads(SETTINGS_FILE.read_text())
-    return {"recording_enabled": False}
-
-
-def save_settings(settings):
-    SETTINGS_FILE.write_text(json.dumps(settings, indent=2))
-
-
-def load_config_data():
-    if os.path.exists(config_paths.CONFIG_FILE):
-        with open(config_paths.CONFIG_FILE) as f:
-            return json.load(f)
-    return {}
-
-
-def refresh_tle_and_predictions():
-    config_data = load_config_data()
-    if not config_data.get("latitude") or not config_data.get("longitude"):
-        print("⚠ No location set — skipping TLE refresh.")
-        return
-
-    tle_data = []
-    for sat_name in tle_utils.TLE_SOURCES.keys():
-        tle = tle_utils.fetch_tle(sat_name)
-        if tle:
-            tle_data.append(tle)
-            print(f"✅ Fetched TLE for {sat_name}")
-        else:
-            print(f"⚠ No TLE found for {sat_name}")
-
-    tle_utils.save_tle(tle_data)
-
-    lat = config_data["latitude"]
-    lon = config_data["longitude"]
-    alt = config_data.get("altitude", 0)
-    tz = config_data.get("timezone", "UTC")
-    tle_path = "app/static/tle/active.txt"
-
-    passes_utils.generate_predictions(lat, lon, alt, tz, tle_path)
-    print("📅 Pass predictions updated for next 24h.")
 
 
 # ┌────────────────────────────────────────────────────────────────────────────┐
@@ -218,21 +174,22 @@ def recordings_file(filename):
 
 @bp.route("/enable", methods=["POST"])
 def enable_recordings():
-    settings = load_settings()
-    if settings.get("recording_enabled"):
+    if scheduler_control.scheduler_pid():
+        scheduler_control.send_command("enable")
         return jsonify({"status": "already enabled"}), 200
 
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+    # No scheduler answering: clear captures orphaned by one that died
+    for proc in psutil.process_iter(['pid', 'name']):
         try:
-            if proc.info['name'] in ('rtl_fm', 'sox'):
+            if proc.info['name'] in ('rtl_fm', 'rtl_sdr', 'sox'):
                 proc.terminate()
         except (psutil.NoSuchProcess, psutil.AccessDenied):
             continue
 
-    settings["recording_enabled"] = True
-    save_settings(settings)
+    settings_store.update(recording_enabled=True)
 
-    refresh_tle_and_predictions()
+    # The scheduler fetches TLEs and predicts passes on startup; refreshing
+    # here as well would run a second, concurrent refresh
     subprocess.Popen(["python3", "-m", "app.utils.sdr_scheduler"])
 
     return jsonify({"status": "enabled"}), 200
@@ -240,45 +197,47 @@ def enable_recordings():
 
 @bp.route("/disable", methods=["POST"])
 def disable_recordings():
-    settings = load_settings()
-    settings["recording_enabled"] = False
-    save_settings(settings)
+    settings_store.update(recording_enabled=False)
 
-    for proc in psutil.process_iter(['pid', 'cmdline']):
+    # The scheduler stops its captures and exits; SIGTERM if the socket is unresponsive
+    pid = scheduler_control.scheduler_pid()
+    if pid and not scheduler_control.send_command("disable"):
         try:
-            if proc.info['cmdline'] and "app.utils.sdr_scheduler" in " ".join(proc.info['cmdline']):
-                proc.terminate()
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass
 
-    return jsonify({"status": "disabled"}), 200
+    return jsonify({"status": "disabled", "pid": pid}), 200
 
 
 @bp.route("/status", methods=["GET"])
 def recordings_status():
-    settings = load_settings()
-    enabled = settings.get("recording_enabled", False)
-
-    scheduler_pid = None
-    for proc in psutil.process_iter(['pid', 'cmdline']):
-        try:
-            if proc.info['cmdline'] and "app.utils.sdr_scheduler" in " ".join(proc.info['cmdline']):
-                scheduler_pid = proc.info['pid']
-                break
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
+    reply = scheduler_control.send_command("status")
+    if not reply or not reply["ok"]:
+        # A scheduler holding the PID lock without answering is still starting up
+        pid = scheduler_control.scheduler_pid()
+        reply = {"recording_enabled": pid is not None, "pid": pid, "next_pass": None, "captures": []}
 
-    if scheduler_pid is None:
-        enabled = False
-        settings["recording_enabled"] = False
-        save_settings(settings)
+    if reply["pid"] is None and settings_store.get("recording_enabled"):
+        settings_store.update(recording_enabled=False)
 
     return jsonify({
-        "recording_enabled": enabled,
-        "scheduler_pid": scheduler_pid
+        "recording_enabled": reply["recording_enabled"],
+        "scheduler_pid": reply["pid"],
+        "next_pass": reply["next_pass"],
+        "captures": reply["captures"]
     })
 
 
+@bp.route("/backfill-ephemeris", methods=["POST"])
+def backfill_ephemeris():
+    """Add ISS position/elevation to sidecars that lack it (`?force=1` redoes all)."""
+    result = backfill(RECORDINGS_DIR, force=request.args.get("force") == "1")
+    if "error" in result:
+        return jsonify({"status": "error", "message": result["error"]}), 400
+    return jsonify({"status": "ok", **result})
+
+
 @bp.route("/upload", methods=["POST"])
 def upload_wav():
     """Handle user-uploaded WAV files for SSTV decoding."""
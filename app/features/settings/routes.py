@@ -6,6 +6,7 @@ from flask import (
 )
 from werkzeug.utils import secure_filename
 from app.config_paths import CONFIG_FILE  # <-- shared path
+from app.utils.config_store import user_config
 from . import bp
 
 @bp.route("/set-theme", methods=["POST"], endpoint="set_theme")
@@ -24,10 +25,11 @@ def import_settings():
         if file:
             filename = secure_filename(file.filename)
             if filename.lower().endswith(".json"):
-                file.save(CONFIG_FILE)
                 try:
-                    with open(CONFIG_FILE, "r") as f:
-                        data = json.load(f)
+                    data = json.load(file.stream)
+                    if not isinstance(data, dict):
+                        raise ValueError("expected a JSON object")
+                    user_config.replace(data)
                     current_app.config.update(
                         LATITUDE=data.get("latitude"),
                         LONGITUDE=data.get("longitude"),
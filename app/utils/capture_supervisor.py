@@ -0,0 +1,254 @@
+"""
+capture_supervisor.py — asyncio supervisor for SDR capture processes.
+
+Captures run on an event loop in a background thread, so the scheduler's
+timer thread stays free for refreshes and control commands while a pass
+is recorded. Each source (rtl_fm for audio, rtl_sdr for raw IQ) is
+started with create_subprocess_exec (no shell) and its stderr is streamed
+into the pass log; its stdout is written to the capture's WavWriter or
+RawWriter in-process by capture_writer.stream() on a worker thread. The
+LOS deadline is enforced by the loop instead of `timeout`. Stopping a
+capture terminates the source, so the writer sees EOF and closes the file
+(patching the header of a WAV).
+
+A capture with `commit_at` is started hot: the source is opened and tuned
+ahead of time and its output goes into a small discard ring until
+`commit_at`, then (ring included) to the writer, so the recording starts
+with the tuner settled and no process start-up gap.
+
+Post-processing steps are argv lists run without a shell, or Python
+callables fn(capture) run on a worker thread — for steps that need what
+only the finished capture knows, such as when its first sample arrived.
+"""
+
+import asyncio
+import os
+import threading
+import time
+
+from app.utils import capture_writer
+
+STOP_GRACE_S = 5  # time allowed after SIGTERM before SIGKILL
+
+
+class Capture:
+    """
+    One supervised source process streamed into `writer` (a
+    capture_writer.WavWriter or RawWriter), plus optional post-processing steps (argv
+    lists or callables taking the Capture). `taps` are capture_writer chunk
+    callbacks.
+    """
+
+    def __init__(self, name, source, writer, deadline, log, post=(), on_done=None,
+                 commit_at=None, ring_bytes=0, taps=()):
+        self.name = name
+        self.source = list(source)
+        self.writer = writer
+        self.taps = list(taps)
+        self.deadline = deadline
+        self.log = log
+        self.post = [step if callable(step) else list(step) for step in post]
+        self.on_done = on_done
+        self.commit_at = commit_at
+        self.ring_bytes = ring_bytes
+        self.started = time.time()
+        self.stream_state = {}  # "streaming"/"committed" times etc., set by the writer thread
+        self.events = []        # e.g. SSTV images detected by a tap, newest last
+        self.finished = None
+        self.returncodes = {}
+        self.error = None
+        self.stop_reason = None
+        self._stop = None  # asyncio.Event, created on the loop
+
+    @property
+    def committed(self):
+        return self.stream_state.get("committed")
+
+    def first_sample_time(self, sample_rate):
+        """Approximate wall-clock time of the first recorded sample, or None if nothing was recorded."""
+        if self.committed is None:
+            return None
+        return self.committed - self.stream_state.get("commit_frames", 0) / sample_rate
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "started": self.started,
+            "deadline": self.deadline,
+            "commit_at": self.commit_at,
+            "phase": "preroll" if self.commit_at and self.committed is None else "recording",
+            "streaming": self.stream_state.get("streaming"),
+            "committed": self.committed,
+            "frames": self.writer.frames,
+            "events": list(self.events),
+            "finished": self.finished,
+            "returncodes": self.returncodes,
+            "error": self.error,
+            "stop_reason": self.stop_reason
+        }
+
+
+async def _pump(stream, log, prefix):
+    """Copy a subprocess stream into the pass log line by line."""
+    while True:
+        line = await stream.readline()
+        if not line:
+            return
+        text = line.decode(errors="replace").rstrip()
+        if text:
+            log.info(f"[{prefix}] {text}")
+
+
+async def _terminate(proc, grace=STOP_GRACE_S):
+    """SIGTERM, then SIGKILL after `grace` seconds; returns the exit code."""
+    if proc.returncode is None:
+        try:
+            proc.terminate()
+        except ProcessLookupError:
+            pass
+    try:
+        return await asyncio.wait_for(proc.wait(), grace)
+    except asyncio.TimeoutError:
+        proc.kill()
+        return await proc.wait()
+
+
+async def run_exec(argv, log, timeout=None):
+    """Run one command without a shell, streaming its output into `log`; returns the exit code."""
+    proc = await asyncio.create_subprocess_exec(
+        *argv, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT
+    )
+    pump = asyncio.ensure_future(_pump(proc.stdout, log, os.path.basename(argv[0])))
+    try:
+        return await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        return await _terminate(proc)
+    finally:
+        await pump
+
+
+class CaptureSupervisor:
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._captures = {}
+
+    def start(self):
+        """Start the event loop thread if it is not running."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever,
+                                            name="capture-supervisor", daemon=True)
+            self._thread.start()
+
+    def submit(self, capture):
+        """Start a Capture; returns a concurrent.futures.Future for it."""
+        self.start()
+        with self._lock:
+            self._captures[capture.name] = capture
+        return asyncio.run_coroutine_threadsafe(self._supervise(capture), self._loop)
+
+    def busy(self):
+        with self._lock:
+            return bool(self._captures)
+
+    def active(self):
+        with self._lock:
+            return [c.to_dict() for c in self._captures.values()]
+
+    def stop(self, name=None, reason="stopped"):
+        """Ask one capture (or all) to stop early; they finalize their output first."""
+        with self._lock:
+            targets = [c for n, c in self._captures.items() if name is None or n == name]
+        for cap in targets:
+            cap.stop_reason = reason
+            if cap._stop is not None:
+                self._loop.call_soon_threadsafe(cap._stop.set)
+        return len(targets)
+
+    def shutdown(self, timeout=STOP_GRACE_S * 3):
+        """Stop every capture, wait for them to finish, then stop the loop."""
+        if self._loop is None:
+            return
+        self.stop(reason="shutdown")
+        deadline = time.time() + timeout
+        while self.busy() and time.time() < deadline:
+            time.sleep(0.1)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=1)
+
+    async def _supervise(self, cap):
+        cap._stop = asyncio.Event()
+        if cap.stop_reason:
+            cap._stop.set()
+        try:
+            await self._pipeline(cap)
+            if not cap.error:
+                for step in cap.post:
+                    if callable(step):
+                        try:
+                            await asyncio.get_running_loop().run_in_executor(None, step, cap)
+                        except Exception as e:
+                            cap.error = f"{getattr(step, '__name__', 'post step')} failed: {e}"
+                            break
+                        continue
+                    code = await run_exec(step, cap.log)
+                    if code:
+                        cap.error = f"{os.path.basename(step[0])} exited with {code}"
+                        break
+        except Exception as e:
+            cap.error = str(e)
+        finally:
+            cap.finished = time.time()
+            with self._lock:
+                self._captures.pop(cap.name, None)
+            if cap.on_done:
+                try:
+                    cap.on_done(cap)
+                except Exception as e:
+                    cap.log.warning(f"Capture completion handler failed: {e}")
+        return cap
+
+    async def _pipeline(self, cap):
+        read_fd, write_fd = os.pipe()
+        try:
+            source = await asyncio.create_subprocess_exec(
+                *cap.source, stdout=write_fd, stderr=asyncio.subprocess.PIPE
+            )
+        except Exception:
+            os.close(read_fd)
+            cap.writer.close()
+            raise
+        finally:
+            os.close(write_fd)
+
+        loop = asyncio.get_running_loop()
+        writing = loop.run_in_executor(None, lambda: capture_writer.stream(
+            read_fd, cap.writer, cap.taps, cap.commit_at, cap.ring_bytes, cap.log, cap.stream_state
+        ))
+        pump = asyncio.ensure_future(_pump(source.stderr, cap.log, os.path.basename(cap.source[0])))
+        source_done = asyncio.ensure_future(source.wait())
+        stop_wait = asyncio.ensure_future(cap._stop.wait())
+        remaining = max(0.0, cap.deadline - time.time())
+        done, _ = await asyncio.wait({source_done, stop_wait}, timeout=remaining,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        stop_wait.cancel()
+        if source_done not in done:
+            # LOS deadline (or a stop request): end the source, let the writer drain
+            cap.stop_reason = cap.stop_reason or "deadline"
+            await _terminate(source)
+        source_code = cap.returncodes[os.path.basename(cap.source[0])] = await source_done
+        await pump
+        try:
+            await writing  # EOF once the source is gone; closes the file
+        except OSError as e:
+            cap.error = f"writing {os.path.basename(cap.writer.path)} failed: {e}"
+            return
+
+        if source_code and not cap.stop_reason:
+            cap.error = f"{os.path.basename(cap.source[0])} exited with {source_code}"
+        elif cap.commit_at is not None and cap.committed is None and not cap.stop_reason:
+            cap.error = f"{os.path.basename(cap.source[0])} stopped during pre-roll"
@@ -0,0 +1,191 @@
+"""
+capture_writer.py — in-process WAV writing for rtl_fm captures.
+
+rtl_fm already emits signed 16-bit little-endian PCM, so wrapping it in a
+WAV needs no second process: the stream is read in large chunks into one
+preallocated buffer and appended to the file, and the RIFF/data sizes are
+patched into the header when the writer is closed (a capture cut short
+still leaves a valid WAV of everything received).
+
+Taps see every committed chunk as fn(chunk, offset): `chunk` is a
+memoryview into the read buffer (valid only during the call; copy what
+you keep) and `offset` is the sample index of its first sample. Level
+meters, detectors and waterfalls hang off this instead of re-reading the
+file.
+"""
+
+import os
+import struct
+import subprocess
+import threading
+import time
+from collections import deque
+
+CHUNK_BYTES = 256 * 1024  # ~2.7 s of 48 kHz mono s16
+
+
+class WavWriter:
+    """Incremental PCM WAV writer; the header is patched with the real sizes on close()."""
+
+    def __init__(self, path, sample_rate, channels=1, sample_width=2):
+        self.path = str(path)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.frame_bytes = channels * sample_width
+        self.data_bytes = 0
+        self._f = open(self.path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        byte_rate = self.sample_rate * self.frame_bytes
+        self._f.write(struct.pack(
+            "<4sI4s4sIHHIIHH4sI",
+            b"RIFF", 36 + self.data_bytes, b"WAVE",
+            b"fmt ", 16, 1, self.channels, self.sample_rate, byte_rate,
+            self.frame_bytes, self.sample_width * 8,
+            b"data", self.data_bytes
+        ))
+
+    @property
+    def frames(self):
+        return self.data_bytes // self.frame_bytes
+
+    def write(self, data):
+        self._f.write(data)
+        self.data_bytes += len(data)
+
+    def close(self):
+        if self._f.closed:
+            return
+        # A stream cut mid-frame must not leave a partial frame in the data size
+        self.data_bytes -= self.data_bytes % self.frame_bytes
+        self._f.truncate(44 + self.data_bytes)
+        self._f.seek(0)
+        self._write_header()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RawWriter:
+    """Headerless writer for raw streams such as rtl_sdr u8 IQ (`frame_bytes` per sample)."""
+
+    def __init__(self, path, frame_bytes=1):
+        self.path = str(path)
+        self.frame_bytes = frame_bytes
+        self.data_bytes = 0
+        self._f = open(self.path, "wb")
+
+    @property
+    def frames(self):
+        return self.data_bytes // self.frame_bytes
+
+    def write(self, data):
+        self._f.write(data)
+        self.data_bytes += len(data)
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def stream(fd, writer, taps=(), commit_at=None, ring_bytes=0, log=None, state=None):
+    """
+    Copy the stream on `fd` into `writer` until EOF; returns the bytes written.
+
+    With `commit_at` (unix seconds) nothing is written before that time:
+    chunks only fill a discard ring of the last `ring_bytes`, which is
+    flushed to the writer (and taps) on commit. `state`, if given, is
+    updated with "streaming" and "committed" timestamps and "commit_frames",
+    the frames written at the commit (so the first sample was captured
+    about commit_frames / rate seconds before "committed").
+    """
+    state = state if state is not None else {}
+    buf = bytearray(CHUNK_BYTES)
+    view = memoryview(buf)
+    ring, ring_size = deque(), 0
+    committed = commit_at is None
+    frame = writer.frame_bytes
+    carry = 0   # bytes of a partial frame left at the front of buf
+    offset = 0  # samples handed to taps so far
+
+    def emit(chunk):
+        nonlocal offset
+        writer.write(chunk)
+        for tap in taps:
+            try:
+                tap(chunk, offset)
+            except Exception as e:
+                if log:
+                    log.warning(f"Capture tap {getattr(tap, '__name__', tap)} failed: {e}")
+        offset += len(chunk) // frame
+
+    try:
+        with os.fdopen(fd, "rb", buffering=0) as f:
+            while True:
+                n = f.readinto(view[carry:])
+                if not n:
+                    break
+                n += carry
+                whole = n - n % frame
+                chunk = view[:whole]
+                if not committed:
+                    if "streaming" not in state:
+                        state["streaming"] = time.time()
+                        if log:
+                            log.info(f"Pre-roll: SDR streaming, committing in "
+                                     f"{max(0.0, commit_at - state['streaming']):.1f}s")
+                    ring.append(bytes(chunk))
+                    ring_size += whole
+                    if time.time() < commit_at:
+                        while len(ring) > 1 and ring_size - len(ring[0]) >= ring_bytes:
+                            ring_size -= len(ring.popleft())
+                    else:
+                        committed = True
+                        state["committed"] = time.time()
+                        if log:
+                            log.info("Pre-roll complete — recording")
+                        flushed = memoryview(b"".join(ring))
+                        state["commit_frames"] = len(flushed) // frame
+                        emit(flushed)
+                        ring = None
+                else:
+                    if "committed" not in state:
+                        state["committed"] = time.time()
+                        state["commit_frames"] = whole // frame
+                    emit(chunk)
+                carry = n - whole
+                if carry:
+                    view[:carry] = view[whole:n]
+    finally:
+        writer.close()
+    return writer.data_bytes
+
+
+def record(source, wav_path, sample_rate, duration, log_file=None, taps=()):
+    """
+    Blocking capture for one-off recordings: run `source` (an argv writing
+    s16 mono PCM to stdout) for `duration` seconds into a WAV. Returns the
+    source's exit code.
+    """
+    proc = subprocess.Popen(source, stdout=subprocess.PIPE, stderr=log_file or subprocess.DEVNULL)
+    timer = threading.Timer(duration, proc.terminate)
+    timer.start()
+    try:
+        stream(os.dup(proc.stdout.fileno()), WavWriter(wav_path, sample_rate), taps)
+    finally:
+        timer.cancel()
+        proc.stdout.close()
+        if proc.poll() is None:
+            proc.terminate()
+    return proc.wait()
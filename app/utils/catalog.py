@@ -0,0 +1,137 @@
+"""
+catalog.py — process-wide satellite catalog shared by prediction and ephemeris helpers.
+
+One Skyfield timescale is loaded per process, and each TLE file's records
+come from the shared memory-mapped TLE index (tle_store.py), indexed here by
+name and NORAD ID. A catalog re-reads its file only when the mtime/size
+changes, and rebuilds only when the content hash does.
+"""
+
+import hashlib
+import os
+import threading
+
+from sgp4.api import Satrec
+from skyfield.api import EarthSatellite, Loader
+
+from app.utils.tle_store import get_store, normalize_name
+
+SKYFIELD_DIR = "./skyfield_data"
+
+_lock = threading.Lock()
+_timescale = None
+_catalogs = {}
+
+
+def get_timescale():
+    """Return the shared Skyfield timescale, loading it on first use."""
+    global _timescale
+    with _lock:
+        if _timescale is None:
+            _timescale = Loader(SKYFIELD_DIR).timescale()
+        return _timescale
+
+
+class SatelliteCatalog:
+    """Parsed view of one TLE file, reloaded when the file changes."""
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.sha256 = None
+        self.text = ""
+        self._stat = None
+        self._records = []
+        self._by_name = {}
+        self._by_norad = {}
+        self._earth_sats = {}
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Reload the file if its mtime/size changed; re-parse only on new content."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._stat, self.sha256, self.text = None, None, ""
+            self._load()
+            return
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stat:
+            return
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        self._stat = stamp
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == self.sha256:
+            return
+        self.sha256 = digest
+        self.text = raw.decode("utf-8", errors="replace")
+        self._load()
+
+    def _load(self):
+        rows = get_store(os.path.dirname(self.path)).for_source(self.path) if self.sha256 else []
+        records = []
+        for row in rows:
+            l1, l2 = row["line1"].decode(), row["line2"].decode()
+            try:
+                satrec = Satrec.twoline2rv(l1, l2)
+            except Exception:
+                continue
+            records.append({
+                "name": row["name"].decode(),
+                "norad": int(row["norad"]),
+                "line1": l1,
+                "line2": l2,
+                "satrec": satrec
+            })
+        self._records = records
+        self._by_name = {normalize_name(r["name"]): r for r in records}
+        self._by_norad = {r["norad"]: r for r in records}
+        self._earth_sats = {}
+
+    def _current(self):
+        with self._lock:
+            self._refresh()
+            return self._records
+
+    def records(self):
+        """All parsed TLE records (dicts with name, norad, line1, line2, satrec)."""
+        return list(self._current())
+
+    def satrecs(self):
+        """(name, Satrec) pairs for the vectorized pass engine."""
+        return [(r["name"], r["satrec"]) for r in self._current()]
+
+    def lookup(self, name=None, norad=None):
+        """Return the record for an exact (normalized) name or NORAD ID."""
+        self._current()
+        if norad is not None:
+            return self._by_norad.get(int(norad))
+        return self._by_name.get(normalize_name(name or ""))
+
+    def find(self, fragment):
+        """Return the first record whose name contains `fragment` (case-insensitive)."""
+        fragment = normalize_name(fragment)
+        for r in self._current():
+            if fragment in normalize_name(r["name"]):
+                return r
+        return None
+
+    def earth_satellite(self, record):
+        """Skyfield EarthSatellite for a record, built once per catalog version."""
+        with self._lock:
+            sat = self._earth_sats.get(record["norad"])
+            if sat is None:
+                sat = EarthSatellite.from_satrec(record["satrec"], get_timescale())
+                sat.name = record["name"]
+                self._earth_sats[record["norad"]] = sat
+            return sat
+
+
+def get_catalog(path):
+    """Return the process-wide catalog for a TLE file path."""
+    key = os.path.abspath(path)
+    with _lock:
+        cat = _catalogs.get(key)
+        if cat is None:
+            cat = _catalogs[key] = SatelliteCatalog(key)
+        return cat
@@ -0,0 +1,179 @@
+"""
+config_store.py — shared, cached access to settings.json and user_config.json.
+
+Every reader in a process shares one JsonStore per file. The parsed JSON is
+kept in memory and only re-read when the file's mtime/size change, so a
+request costs one stat() instead of a JSON parse. Writes are atomic (temp
+file + rename) and serialized across processes with an flock on a sidecar
+.lock file; read-modify-write goes through update() so concurrent writers
+never drop each other's keys. Subscribers are called with (new, old)
+whenever a change is seen, whether written here or by another process.
+"""
+
+import copy
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from app import config_paths
+
+SETTINGS_FILE = Path("settings.json")
+WATCH_INTERVAL_S = 2.0
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class JsonStore:
+    def __init__(self, path, default=None):
+        self.path = Path(path)
+        self.default = default or {}
+        self._lock = threading.RLock()
+        self._data = None
+        self._stamp = None
+        self._subscribers = []
+        self._watcher = None
+
+    def _file_stamp(self):
+        try:
+            st = self.path.stat()
+            return st.st_mtime_ns, st.st_size
+        except FileNotFoundError:
+            return None
+
+    def _read_file(self):
+        try:
+            return json.loads(self.path.read_text())
+        except FileNotFoundError:
+            return copy.deepcopy(self.default)
+
+    def _revalidate(self):
+        """Re-read the file if it changed; returns (new, old) when it did, else None."""
+        stamp = self._file_stamp()
+        with self._lock:
+            if self._data is not None and stamp == self._stamp:
+                return None
+            try:
+                data = self._read_file()
+            except ValueError:
+                # Hand-edited or half-written by an old writer: keep what we had
+                if self._data is None:
+                    self._data = copy.deepcopy(self.default)
+                return None
+            old, first = self._data, self._data is None
+            self._data, self._stamp = data, stamp
+        if first or data == old:
+            return None
+        return data, old
+
+    def _notify(self, change):
+        if change is None:
+            return
+        for fn in list(self._subscribers):
+            try:
+                fn(copy.deepcopy(change[0]), copy.deepcopy(change[1]))
+            except Exception as e:
+                print(f"⚠ {self.path.name} subscriber failed: {e}")
+
+    def get(self, key=None, default=None):
+        """The whole document (a copy), or one key of it."""
+        self._notify(self._revalidate())
+        with self._lock:
+            if key is not None:
+                return copy.deepcopy(self._data.get(key, default))
+            return copy.deepcopy(self._data)
+
+    def update(self, changes=None, **kwargs):
+        """
+        Merge `changes` into the file under the cross-process lock and write
+        it atomically. `changes` may be a dict or a function(doc) -> doc.
+        Returns the document as written.
+        """
+        lock_path = self.path.with_name(self.path.name + ".lock")
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    doc = self._read_file()
+                except ValueError:
+                    doc = copy.deepcopy(self.default)
+                if callable(changes):
+                    doc = changes(doc)
+                else:
+                    doc.update(changes or {}, **kwargs)
+                self._write_file(doc)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._notify(self._revalidate())
+        return copy.deepcopy(doc)
+
+    def replace(self, doc):
+        """Overwrite the whole document (e.g. an imported config)."""
+        return self.update(lambda _: dict(doc))
+
+    def _write_file(self, doc):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(doc, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def subscribe(self, fn):
+        """Call fn(new, old) whenever the document changes; returns fn."""
+        self._subscribers.append(fn)
+        return fn
+
+    def watch(self, interval=WATCH_INTERVAL_S):
+        """
+        Start a daemon thread that stat()s the file every `interval` seconds,
+        so subscribers hear about other processes' writes without anyone
+        calling get().
+        """
+        with self._lock:
+            if self._watcher is not None:
+                return
+            self._watcher = threading.Thread(target=self._watch, args=(interval,),
+                                             name=f"watch-{self.path.name}", daemon=True)
+            self._watcher.start()
+
+    def _watch(self, interval):
+        self.get()  # prime the cache so the first change is reported
+        while True:
+            time.sleep(interval)
+            self._notify(self._revalidate())
+
+
+def open_store(path, default=None):
+    """The process-wide JsonStore for `path`."""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = JsonStore(path, default)
+        return store
+
+
+# settings.json: recording_enabled, rtl_ppm, device_ppm
+settings = open_store(SETTINGS_FILE)
+
+# user_config.json: observer location, timezone, theme
+user_config = open_store(config_paths.CONFIG_FILE, {
+    "latitude": None,
+    "longitude": None,
+    "altitude_m": None,
+    "timezone": None,
+    "theme": "auto"
+})
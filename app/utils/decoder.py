@@ -1,6 +1,7 @@
 from app.utils.pass_info import get_iss_info_at
-from app import config_paths
-import subprocess, json
+from app.utils.config_store import user_config
+from app.utils.capture_writer import WavWriter
+import subprocess, json, struct, tempfile
 from pathlib import Path
 import numpy as np
 from scipy.io import wavfile
@@ -65,12 +66,31 @@ def decode_sstv_image(wav_path: Path, output_path: Path):
         print("❌ `sstv` not found in PATH. Install it in your venv.")
         return None
 
+def decode_sstv_segment(wav_path: Path, start_frame: int, frames: int, output_path: Path):
+    """
+    Decode one image from part of a capture WAV — which may still be being
+    recorded, so the PCM is read past its (not yet patched) header. The
+    segment should start at the image's VIS header.
+    """
+    with open(wav_path, "rb") as f:
+        header = f.read(44)
+        rate, = struct.unpack_from("<I", header, 24)
+        f.seek(44 + 2 * start_frame)
+        pcm = f.read(2 * frames)
+    if not pcm:
+        return None
+    with tempfile.TemporaryDirectory() as tmp:
+        clip, resampled = Path(tmp) / "clip.wav", Path(tmp) / "clip_11025.wav"
+        with WavWriter(clip, rate) as w:
+            w.write(pcm)
+        resample_wav(clip, resampled)
+        return decode_sstv_image(resampled, output_path)
+
 def write_metadata(base_name: str, wav_path: Path, sstv_detected: bool, image_path: Path | None):
     """Write metadata JSON for uploaded audio."""
     # Try to get config for observer location
     try:
-        with open(config_paths.CONFIG_FILE) as f:
-            cfg = json.load(f)
+        cfg = user_config.get()
         lat = cfg.get("latitude")
         lon = cfg.get("longitude")
         alt = cfg.get("altitude_m", 0)
@@ -0,0 +1,120 @@
+"""
+elevation_gate.py — trim recording windows to the useful part of a pass.
+
+A pass is predicted from horizon to horizon, but below a few degrees the
+signal is mostly noise (and often blocked by terrain or buildings). Using
+the precomputed track in the pass store, each pass is cut down to the time
+between the first and last sample where the satellite is above both the
+minimum elevation and the horizon mask at its azimuth. Passes whose peak
+stays below the minimum peak elevation are not recorded at all.
+
+Configured under "elevation_gate" in settings.json, e.g.
+
+    "elevation_gate": {
+        "min_elevation": 10,
+        "min_peak": 20,
+        "satellites": {"ISS": {"min_elevation": 5, "min_peak": 15}},
+        "horizon_mask": [[0, 5], [90, 15], [180, 3], [270, 8]]
+    }
+
+The horizon mask is a list of [azimuth, elevation] points in degrees,
+interpolated linearly (wrapping at 360°).
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.utils import pass_store
+from app.utils.config_store import settings as settings_store
+from app.utils.pass_selection import matches_satellite
+
+
+def load_gate_settings(min_elevation=0.0, min_peak=0.0):
+    """The "elevation_gate" block of settings.json, defaulting to the given thresholds."""
+    cfg = settings_store.get("elevation_gate") or {}
+    mask = []
+    for point in cfg.get("horizon_mask") or []:
+        try:
+            mask.append((float(point[0]) % 360.0, float(point[1])))
+        except (IndexError, TypeError, ValueError):
+            print(f"⚠ Ignoring malformed horizon mask point: {point}")
+    mask.sort()
+    return {
+        "min_elevation": float(cfg.get("min_elevation", min_elevation)),
+        "min_peak": float(cfg.get("min_peak", min_peak)),
+        "satellites": cfg.get("satellites") or {},
+        "horizon_mask": mask
+    }
+
+
+def thresholds_for(satellite, settings):
+    """(min_elevation, min_peak) for a satellite, with per-satellite overrides."""
+    min_el, min_peak = settings["min_elevation"], settings["min_peak"]
+    for name, override in settings["satellites"].items():
+        if matches_satellite(satellite, name):
+            min_el = float(override.get("min_elevation", min_el))
+            min_peak = float(override.get("min_peak", min_peak))
+            break
+    return min_el, min_peak
+
+
+def mask_elevation(az, mask):
+    """Horizon mask elevation at azimuth(s) `az`; 0 everywhere without a mask."""
+    if not mask:
+        return np.zeros_like(np.asarray(az, dtype=float))
+    xs, ys = zip(*mask)
+    return np.interp(az, xs, ys, period=360.0)
+
+
+def recording_window(track, min_elevation, mask=()):
+    """
+    (start, end) unix seconds between which the track is above both
+    `min_elevation` and the horizon mask, or None if it never is.
+    """
+    el = track["el"]
+    if not len(el):
+        return None
+    limit = np.maximum(min_elevation, mask_elevation(track["az"], mask))
+    above = np.flatnonzero(el >= limit)
+    if not above.size:
+        return None
+    return float(track["t"][above[0]]), float(track["t"][above[-1]])
+
+
+def gate_pass(p, settings, track=None):
+    """
+    Recording window for one pass as (start, end) datetimes, or a string
+    with the reason it should not be recorded. Without a track the whole
+    pass is kept if its peak qualifies.
+    """
+    min_el, min_peak = thresholds_for(p["satellite"], settings)
+    if p["max_elevation"] < min_peak:
+        return f"peak {p['max_elevation']:.1f}° is below the {min_peak:g}° minimum"
+    if track is None:
+        return p["start"], p["end"]
+    window = recording_window(track, min_el, settings["horizon_mask"])
+    if window is None:
+        return f"never rises above {min_el:g}°" + (" and the horizon mask" if settings["horizon_mask"] else "")
+    tz = p["start"].tzinfo or timezone.utc
+    return tuple(datetime.fromtimestamp(t, tz) for t in window)
+
+
+def gate_passes(passes, settings=None, min_elevation=0.0, min_peak=0.0):
+    """
+    Apply the elevation gate to pass dicts (with "id" when stored). Returns
+    (gated, dropped): gated passes have "start"/"end" set to the recording
+    window and the predicted horizon crossings kept in "aos"/"los"; dropped
+    entries are {"pass", "score", "reason"} as from pass_selection.
+    """
+    settings = settings or load_gate_settings(min_elevation, min_peak)
+    gated, dropped = [], []
+    for p in passes:
+        track = (pass_store.get_track(p["id"], p["satellite"], p["start"])
+                 if p.get("id") is not None else None)
+        window = gate_pass(p, settings, track)
+        if isinstance(window, str):
+            dropped.append({"pass": p, "score": 0.0, "reason": window})
+            continue
+        gated.append({**p, "aos": p["start"], "los": p["end"], "start": window[0], "end": window[1]})
+    return gated, dropped
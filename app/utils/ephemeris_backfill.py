@@ -0,0 +1,95 @@
+"""
+ephemeris_backfill.py — add ISS position/elevation fields to recording sidecars.
+
+Scans every recording JSON sidecar, gathers their pass times, and evaluates
+the ISS sub-point, altitude and observer elevation for all of them in one
+Skyfield call over a Time array (per ISS TLE used), then writes the fields
+back. Sidecars that already carry the fields are left alone unless forced.
+
+    python -m app.utils.ephemeris_backfill [--force]
+"""
+
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from app.utils.config_store import user_config
+from app.utils.pass_info import get_iss_info_batch
+
+RECORDINGS_DIR = Path("recordings")
+FIELDS = ("iss_lat", "iss_lon", "iss_alt_km", "iss_elev_deg")
+
+
+def load_observer():
+    """(lat, lon, alt_m) from the user config, or None if no location is set."""
+    cfg = user_config.get()
+    if cfg.get("latitude") is None or cfg.get("longitude") is None:
+        return None
+    return float(cfg["latitude"]), float(cfg["longitude"]), float(cfg.get("altitude_m") or 0)
+
+
+def sidecar_time(meta):
+    """Pass time of a sidecar: AOS/LOS midpoint when known, else its timestamp."""
+    try:
+        if meta.get("aos") and meta.get("los"):
+            aos = datetime.fromisoformat(meta["aos"])
+            los = datetime.fromisoformat(meta["los"])
+            return aos + (los - aos) / 2
+        if meta.get("timestamp"):
+            return datetime.fromisoformat(meta["timestamp"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backfill(recordings_dir=RECORDINGS_DIR, force=False, observer=None):
+    """
+    Fill FIELDS into every sidecar under `recordings_dir` that lacks them
+    (all of them with `force`). Returns counts of scanned, updated and
+    skipped sidecars, or an "error" entry if nothing could be computed.
+    """
+    observer = observer or load_observer()
+    if observer is None:
+        return {"error": "No location set"}
+
+    pending, skipped, scanned = [], 0, 0
+    for path in sorted(Path(recordings_dir).rglob("*.json")):
+        scanned += 1
+        try:
+            meta = json.loads(path.read_text())
+        except Exception:
+            skipped += 1
+            continue
+        if not isinstance(meta, dict) or (not force and all(k in meta for k in FIELDS)):
+            skipped += 1
+            continue
+        dt = sidecar_time(meta)
+        if dt is None:
+            skipped += 1
+            continue
+        pending.append((path, meta, dt))
+
+    infos = get_iss_info_batch([dt for _, _, dt in pending], *observer)
+    if infos is None:
+        return {"error": "No ISS TLE available"}
+
+    updated = 0
+    for (path, meta, _), info in zip(pending, infos):
+        meta.update(info)
+        try:
+            path.write_text(json.dumps(meta, indent=2))
+            updated += 1
+        except Exception as e:
+            print(f"⚠ Could not update {path.name}: {e}")
+            skipped += 1
+    return {"scanned": scanned, "updated": updated, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    result = backfill(force="--force" in sys.argv[1:])
+    if "error" in result:
+        print(f"❌ {result['error']}")
+        sys.exit(1)
+    print(f"✅ Backfilled {result['updated']} of {result['scanned']} sidecars "
+          f"({result['skipped']} skipped)")
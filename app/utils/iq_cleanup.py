@@ -2,37 +2,50 @@ import os
 from pathlib import Path
 import time
 import json
+from app.utils.config_store import settings
 
 RECORDINGS_DIR = Path("recordings")
 STATE_FILE = os.path.expanduser("~/sstv-groundstation/current_pass.json")
+ACTIVE_WRITE_S = 120      # an IQ file modified this recently is still being captured
+IQ_RETENTION_DAYS = 3     # settings.json "iq_retention_days"; kept for re-demodulation
 
 
-def is_pass_in_progress():
-    if not os.path.exists(STATE_FILE):
-        return False
+def current_iq_file():
     try:
-        with open(STATE_FILE) as f:
-            data = json.load(f)
-        # Optionally, check end_time
-        return True
+        with open(STATE_FILE) as state:
+            return json.load(state).get("iq_file")
     except Exception:
+        return None
+
+
+def is_orphan(f, current=None):
+    """
+    True for an IQ file nothing needs: not the current pass, not being
+    written, and either without a finished recording's metadata (the
+    capture died) or older than the retention period.
+    """
+    if str(f) == (current if current is not None else current_iq_file()):
         return False
+    try:
+        age = time.time() - f.stat().st_mtime
+    except FileNotFoundError:
+        return False
+    if age < ACTIVE_WRITE_S:
+        return False
+    try:
+        retention_days = float(settings.get("iq_retention_days", IQ_RETENTION_DAYS))
+    except (TypeError, ValueError):
+        retention_days = IQ_RETENTION_DAYS
+    return not f.with_suffix(".json").exists() or age > retention_days * 86400
 
 
 def cleanup_orphan_iq():
-    """Delete all orphan IQ files (not in use by a current pass)."""
-    in_progress = is_pass_in_progress()
+    """Delete all orphan IQ files (see is_orphan)."""
+    current = current_iq_file() or ""
     deleted = []
     for f in RECORDINGS_DIR.glob("*.iq"):
-        if in_progress:
-            # If pass in progress, skip deleting the current IQ file
-            try:
-                with open(STATE_FILE) as state:
-                    state_data = json.load(state)
-                if str(f) == state_data.get("iq_file"):
-                    continue
-            except Exception:
-                pass
+        if not is_orphan(f, current):
+            continue
         try:
             os.remove(f)
             deleted.append(str(f))
@@ -0,0 +1,261 @@
+"""
+iq_demod.py — block-wise NumPy FM demodulation of rtl_sdr u8 IQ recordings.
+
+IQ captures are tuned TUNE_OFFSET_HZ away from the downlink (keeping the
+RTL's DC spike out of the channel) and stored raw; the recording's JSON
+metadata describes them under "iq". Demodulation is a vectorized pipeline run over
+fixed-size blocks of the memory-mapped file, so a whole pass never has to
+fit in RAM:
+
+    frequency shift -> decimating FIR (channel filter) -> polar
+    discriminator -> de-emphasis -> s16 WAV
+
+All stages carry their state between blocks, so block boundaries are
+seamless. When the metadata has the pass's predicted Doppler curve (from
+the range rate of its precomputed track) and the time of the first
+sample, DopplerDemodulator follows the curve sample by sample, so the
+channel filter needs no margin for drift. A stored pass can be
+re-demodulated later with another bandwidth or offset:
+
+    python -m app.utils.iq_demod recordings/<base>.iq --bandwidth 12000
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+from app.utils.capture_writer import WavWriter
+
+IQ_RATE = 960_000             # valid rtl_sdr rate, 20x the audio rate
+AUDIO_RATE = 48_000
+TUNE_OFFSET_HZ = 200_000      # tuner sits this far above the downlink
+BANDWIDTH_HZ = 24_000         # NFM channel plus ±3.5 kHz of untracked Doppler (ISS, 2 m)
+TRACKED_BANDWIDTH_HZ = 16_000 # NFM channel alone: 2 x (5 kHz deviation + 3 kHz audio)
+DEVIATION_HZ = 5_000          # maps to half of full scale in the WAV
+DEEMPH_TAU_S = 75e-6          # as rtl_fm -E deemp; 0 disables
+FIR_TAPS = 129
+BLOCK_SAMPLES = 1 << 20       # complex samples per block (2 MiB of u8 IQ)
+SPEED_OF_LIGHT_KM_S = 299792.458
+
+
+def iq_info(sample_rate, center_hz, channel_hz, start=None, doppler=None):
+    """
+    The "iq" block of a recording's metadata. `start` is the unix time of
+    the first sample and `doppler` a curve from doppler_curve().
+    """
+    return {"format": "rtl_sdr_u8", "sample_rate": sample_rate,
+            "center_hz": center_hz, "channel_hz": channel_hz,
+            "start": start, "doppler": doppler}
+
+
+def doppler_curve(track, channel_hz):
+    """
+    Predicted Doppler shift of `channel_hz` over a pass, from the range
+    rate of its pass_store track: {"t0", "step", "hz": [...]}.
+    """
+    if track is None or not len(track["range_rate_km_s"]):
+        return None
+    hz = -track["range_rate_km_s"].astype(np.float64) / SPEED_OF_LIGHT_KM_S * channel_hz
+    return {"t0": float(track["t0"]), "step": float(track["step"]), "hz": np.round(hz, 1).tolist()}
+
+
+def read_iq_info(iq_path):
+    """The "iq" block from the recording metadata next to an IQ file, or None."""
+    try:
+        return json.loads(Path(iq_path).with_suffix(".json").read_text()).get("iq")
+    except (FileNotFoundError, ValueError, AttributeError):
+        return None
+
+
+def channel_offset_hz(meta):
+    """Where the downlink sits relative to the tuner, from IQ metadata (or the default offset)."""
+    if meta and "channel_hz" in meta and "center_hz" in meta:
+        return float(meta["channel_hz"]) - float(meta["center_hz"])
+    return -float(TUNE_OFFSET_HZ)
+
+
+def iq_blocks(iq_path, block_samples=BLOCK_SAMPLES):
+    """Yield complex64 blocks of a u8 IQ file, memory-mapped rather than read whole."""
+    raw = np.memmap(iq_path, dtype=np.uint8, mode="r")
+    n = len(raw) - len(raw) % 2
+    for start in range(0, n, block_samples * 2):
+        block = raw[start:min(start + block_samples * 2, n)].astype(np.float32)
+        block -= 127.5
+        block /= 127.5
+        yield block.view(np.complex64)
+
+
+def demodulator_for(meta, doppler=True, **kwargs):
+    """
+    Demodulator for IQ described by `meta` (an "iq" block): Doppler-tracked
+    at TRACKED_BANDWIDTH_HZ when the curve and start time are known and
+    `doppler` is true, fixed-offset otherwise. kwargs go to the demodulator.
+    """
+    meta = meta or {}
+    rate = int(meta.get("sample_rate") or IQ_RATE)
+    offset = kwargs.pop("offset_hz", None)
+    offset = channel_offset_hz(meta) if offset is None else offset
+    curve = meta.get("doppler")
+    if doppler and curve and curve.get("hz") and meta.get("start") is not None:
+        kwargs.setdefault("bandwidth_hz", TRACKED_BANDWIDTH_HZ)
+        t = curve["t0"] + curve["step"] * np.arange(len(curve["hz"]))
+        return DopplerDemodulator(t, curve["hz"], meta["start"], rate, offset_hz=offset, **kwargs)
+    return FmDemodulator(rate, offset_hz=offset, **kwargs)
+
+
+class FmDemodulator:
+    """
+    Stateful FM demodulator: feed consecutive complex IQ blocks to
+    process(), get float32 audio at `audio_rate` (±1.0 = ±2 x deviation).
+    """
+
+    def __init__(self, iq_rate=IQ_RATE, audio_rate=AUDIO_RATE, offset_hz=0.0,
+                 bandwidth_hz=BANDWIDTH_HZ, deviation_hz=DEVIATION_HZ,
+                 deemph_tau=DEEMPH_TAU_S, fir_taps=FIR_TAPS):
+        if iq_rate % audio_rate:
+            raise ValueError(f"IQ rate {iq_rate} is not a multiple of the audio rate {audio_rate}")
+        self.iq_rate = iq_rate
+        self.audio_rate = audio_rate
+        self.decim = iq_rate // audio_rate
+        self.offset_hz = float(offset_hz)
+        self.bandwidth_hz = bandwidth_hz
+        self.gain = audio_rate / (2 * math.pi * deviation_hz) * 0.5
+        # Reversed so each sliding window dotted with it is one FIR output
+        self._h = signal.firwin(fir_taps, bandwidth_hz / 2, fs=iq_rate)[::-1].astype(np.complex64)
+        self._hist = np.zeros(fir_taps - 1, np.complex64)
+        self._skip = 0            # window start of the next output, relative to _hist
+        self._phase = 0.0         # mixer phase, in cycles
+        self._last = np.complex64(1)
+        if deemph_tau:
+            alpha = 1 - math.exp(-1 / (audio_rate * deemph_tau))
+            self._deemph = ([alpha], [1, alpha - 1])
+            self._deemph_zi = np.zeros(1)
+        else:
+            self._deemph = None
+
+    def shift_hz(self, n):
+        """
+        Offset (Hz) of the signal for the next `n` samples: a scalar, or one
+        value per sample for a moving signal. Constant here.
+        """
+        return self.offset_hz
+
+    def _mix(self, x):
+        hz = self.shift_hz(len(x))
+        step = -np.asarray(hz, dtype=np.float64) / self.iq_rate
+        if np.ndim(step) == 0:
+            if step == 0:
+                return x
+            phase = self._phase + step * np.arange(len(x))
+            self._phase = (self._phase + step * len(x)) % 1.0
+        else:
+            phase = self._phase + np.concatenate(([0.0], np.cumsum(step[:-1])))
+            self._phase = (phase[-1] + step[-1]) % 1.0
+        return x * np.exp(2j * np.pi * phase).astype(np.complex64)
+
+    def _decimate(self, x):
+        data = np.concatenate((self._hist, x))
+        taps = len(self._h)
+        if len(data) - self._skip < taps:
+            self._hist = data
+            return np.empty(0, np.complex64)
+        windows = sliding_window_view(data, taps)[self._skip::self.decim]
+        y = windows @ self._h
+        next_start = self._skip + len(windows) * self.decim
+        keep = min(next_start, len(data))
+        self._hist = data[keep:]
+        self._skip = next_start - keep
+        return y
+
+    def process(self, iq):
+        mixed = self._mix(np.asarray(iq, dtype=np.complex64))
+        y = self._decimate(mixed)
+        if not len(y):
+            return np.empty(0, np.float32)
+        prev = np.concatenate(([self._last], y[:-1]))
+        self._last = y[-1]
+        audio = np.angle(y * np.conj(prev)) * self.gain
+        if self._deemph is not None:
+            audio, self._deemph_zi = signal.lfilter(*self._deemph, audio, zi=self._deemph_zi)
+        return audio.astype(np.float32)
+
+
+class DopplerDemodulator(FmDemodulator):
+    """
+    FmDemodulator following a predicted Doppler curve: each sample is
+    shifted by the fixed offset plus the curve (curve_hz at unix times
+    curve_t) interpolated at its capture time, counted from `start`.
+    """
+
+    def __init__(self, curve_t, curve_hz, start, iq_rate=IQ_RATE, **kwargs):
+        super().__init__(iq_rate, **kwargs)
+        self.curve_t = np.asarray(curve_t, dtype=np.float64)
+        self.curve_hz = np.asarray(curve_hz, dtype=np.float64)
+        self._samples = 0
+        self._start = float(start)
+
+    def shift_hz(self, n):
+        t = self._start + (self._samples + np.arange(n)) / self.iq_rate
+        self._samples += n
+        return self.offset_hz + np.interp(t, self.curve_t, self.curve_hz)
+
+
+def to_pcm16(audio):
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+
+
+def demodulate_file(iq_path, wav_path=None, demod=None, block_samples=BLOCK_SAMPLES, taps=()):
+    """
+    Demodulate an IQ recording into a WAV (default: same base name), block
+    by block. Without `demod`, one is built from the file's metadata
+    (Doppler-tracked when it can be). `taps`
+    get each audio block as capture_writer taps do. Returns the WAV path.
+    """
+    iq_path = Path(iq_path)
+    wav_path = Path(wav_path) if wav_path else iq_path.with_suffix(".wav")
+    if demod is None:
+        demod = demodulator_for(read_iq_info(iq_path))
+    offset = 0
+    with WavWriter(wav_path, demod.audio_rate) as wav:
+        for block in iq_blocks(iq_path, block_samples):
+            pcm = memoryview(to_pcm16(demod.process(block)).tobytes())
+            wav.write(pcm)
+            for tap in taps:
+                tap(pcm, offset)
+            offset += len(pcm) // 2
+    return wav_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FM-demodulate an rtl_sdr u8 IQ recording to WAV.")
+    parser.add_argument("iq")
+    parser.add_argument("wav", nargs="?")
+    parser.add_argument("--rate", type=int, help="IQ sample rate (default: from metadata)")
+    parser.add_argument("--offset", type=float,
+                        help="channel minus tuner frequency in Hz (default: from metadata)")
+    parser.add_argument("--bandwidth", type=float,
+                        help=f"channel filter width in Hz (default: {TRACKED_BANDWIDTH_HZ} with Doppler "
+                             f"tracking, else {BANDWIDTH_HZ})")
+    parser.add_argument("--no-doppler", action="store_true",
+                        help="ignore the predicted Doppler curve in the metadata")
+    parser.add_argument("--deviation", type=float, default=DEVIATION_HZ)
+    parser.add_argument("--tau", type=float, default=DEEMPH_TAU_S, help="de-emphasis (s), 0 to disable")
+    args = parser.parse_args(argv)
+
+    meta = dict(read_iq_info(args.iq) or {})
+    if args.rate:
+        meta["sample_rate"] = args.rate
+    kwargs = {"offset_hz": args.offset, "deviation_hz": args.deviation, "deemph_tau": args.tau}
+    if args.bandwidth:
+        kwargs["bandwidth_hz"] = args.bandwidth
+    demod = demodulator_for(meta, doppler=not args.no_doppler, **kwargs)
+    print(demodulate_file(args.iq, args.wav, demod))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+pass_engine.py — vectorized SGP4 pass prediction for whole TLE catalogs.
+
+Every satellite is propagated on one shared coarse time grid with a single
+SatrecArray call per chunk, horizon crossings and culminations are located
+with NumPy, and only the short windows around those events are refined on a
+fine grid. Passes can optionally carry a sampled track (azimuth, elevation,
+range, range rate and sub-satellite point) computed in the same pass.
+"""
+
+from datetime import datetime, timezone
+
+import numpy as np
+from sgp4.api import SatrecArray
+from skyfield.api import wgs84
+from skyfield.sgp4lib import theta_GMST1982
+
+COARSE_STEP_S = 60      # shared grid spacing for the whole catalog
+FINE_STEP_S = 1         # refinement spacing around rise/culmination/set
+CHUNK_SIZE = 200        # satellites propagated per SatrecArray call
+GRAZE_MARGIN_DEG = 1.0  # coarse peaks this close below the horizon get refined
+TRACK_STEP_S = 1        # sample spacing of per-pass tracks
+UNIX_JD = 2440587.5
+EARTH_ROTATION = 7.292115146706979e-5  # rad/s
+WGS84_A, WGS84_F = 6378.137, 1 / 298.257223563
+
+
+def _jd_split(unix_s):
+    """Split unix seconds into SGP4 (whole, fraction) Julian date arrays."""
+    days = np.floor(unix_s / 86400.0)
+    return UNIX_JD + days, (unix_s - days * 86400.0) / 86400.0
+
+
+def _teme_to_ecef(r, jd, fr):
+    """Rotate TEME positions (..., n, 3) into the Earth-fixed frame."""
+    theta, _ = theta_GMST1982(jd, fr)
+    c, s = np.cos(theta), np.sin(theta)
+    x, y, z = r[..., 0], r[..., 1], r[..., 2]
+    return np.stack((c * x + s * y, -s * x + c * y, z), axis=-1)
+
+
+def _teme_to_ecef_rv(r, v, jd, fr):
+    """Rotate TEME position/velocity into Earth-fixed position and velocity."""
+    r_ecef = _teme_to_ecef(r, jd, fr)
+    v_rot = _teme_to_ecef(v, jd, fr)
+    # Remove the frame rotation: v_ecef = R v - omega x r_ecef
+    v_rot[..., 0] += EARTH_ROTATION * r_ecef[..., 1]
+    v_rot[..., 1] -= EARTH_ROTATION * r_ecef[..., 0]
+    return r_ecef, v_rot
+
+
+def observer_frame(lat, lon, alt):
+    """Return (ECEF position km, local up unit vector) for an observer."""
+    pos = wgs84.latlon(latitude_degrees=lat, longitude_degrees=lon, elevation_m=alt)
+    phi, lam = np.radians(lat), np.radians(lon)
+    up = np.array([np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)])
+    return np.asarray(pos.itrs_xyz.km), up
+
+
+def observer_enu(lat, lon):
+    """Rows are the local east, north and up unit vectors in ECEF."""
+    phi, lam = np.radians(lat), np.radians(lon)
+    return np.array([
+        [-np.sin(lam), np.cos(lam), 0.0],
+        [-np.sin(phi) * np.cos(lam), -np.sin(phi) * np.sin(lam), np.cos(phi)],
+        [np.cos(phi) * np.cos(lam), np.cos(phi) * np.sin(lam), np.sin(phi)],
+    ])
+
+
+def _subpoint(r_ecef):
+    """Geodetic latitude/longitude (degrees) below ECEF positions (Bowring)."""
+    x, y, z = r_ecef[..., 0], r_ecef[..., 1], r_ecef[..., 2]
+    b = WGS84_A * (1 - WGS84_F)
+    e2 = WGS84_F * (2 - WGS84_F)
+    ep2 = (WGS84_A ** 2 - b ** 2) / b ** 2
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * b)
+    lat = np.arctan2(z + ep2 * b * np.sin(theta) ** 3, p - e2 * WGS84_A * np.cos(theta) ** 3)
+    return np.degrees(lat), np.degrees(np.arctan2(y, x))
+
+
+def _elevation(r_ecef, err, obs_xyz, obs_up):
+    """
+    Topocentric elevation in degrees of Earth-fixed positions (..., 3).
+    Observer arrays broadcast against the positions, so a leading observer
+    axis evaluates many sites at once. Propagation errors read as -90.
+    """
+    rho = r_ecef - obs_xyz
+    sin_el = np.einsum("...i,...i->...", rho, obs_up) / np.linalg.norm(rho, axis=-1)
+    el = np.degrees(np.arcsin(np.clip(sin_el, -1.0, 1.0)))
+    return np.where((err != 0) | ~np.isfinite(el), -90.0, el)
+
+
+def _fine_elevation(satrec, windows, obs_xyz, obs_up, step=FINE_STEP_S):
+    """
+    Evaluate one satellite's elevation on fine grids over several
+    [t_a, t_b] windows with a single SGP4 call; returns [(t, el), ...].
+    Each window is (t_a, t_b, k) where k indexes the observer arrays.
+    """
+    ts = [np.arange(a, b + step, step, dtype=float) for a, b, _ in windows]
+    t = np.concatenate(ts)
+    k = np.repeat([w[2] for w in windows], [len(x) for x in ts])
+    jd, fr = _jd_split(t)
+    err, r, _ = satrec.sgp4_array(jd, fr)
+    el = _elevation(_teme_to_ecef(r, jd, fr), err, obs_xyz[k], obs_up[k])
+    cuts = np.cumsum([len(x) for x in ts])[:-1]
+    return list(zip(ts, np.split(el, cuts)))
+
+
+def pass_tracks(satrec, spans, obs_xyz, enu, step=TRACK_STEP_S):
+    """
+    Sample one satellite over several [rise, set] spans (unix seconds) with
+    a single SGP4 call. Returns one track per span: a dict with t0, step and
+    float32 arrays az, el (degrees), range_km, range_rate_km_s, lat, lon
+    (sub-satellite point, degrees).
+    """
+    ts = [a + step * np.arange(int(np.ceil((b - a) / step)) + 1) for a, b in spans]
+    t = np.concatenate(ts)
+    jd, fr = _jd_split(t)
+    _, r, v = satrec.sgp4_array(jd, fr)
+    r_ecef, v_ecef = _teme_to_ecef_rv(r, v, jd, fr)
+    rho = r_ecef - obs_xyz
+    rng = np.linalg.norm(rho, axis=-1)
+    e, n, u = (rho @ enu.T).T
+    cols = {
+        "az": np.degrees(np.arctan2(e, n)) % 360.0,
+        "el": np.degrees(np.arcsin(np.clip(u / rng, -1.0, 1.0))),
+        "range_km": rng,
+        "range_rate_km_s": np.einsum("ij,ij->i", rho, v_ecef) / rng,
+    }
+    cols["lat"], cols["lon"] = _subpoint(r_ecef)
+
+    tracks, lo = [], 0
+    for (a, _), seg in zip(spans, ts):
+        hi = lo + len(seg)
+        track = {"t0": float(a), "step": float(step)}
+        track.update({k: col[lo:hi].astype(np.float32) for k, col in cols.items()})
+        tracks.append(track)
+        lo = hi
+    return tracks
+
+
+def _crossing(t, el, horizon, rising):
+    """Linearly interpolate the first horizon crossing on a fine grid."""
+    above = el > horizon
+    idx = np.flatnonzero(above[1:] != above[:-1])
+    if rising:
+        idx = idx[above[idx + 1]]
+    else:
+        idx = idx[~above[idx + 1]]
+    if not len(idx):
+        return None
+    k = idx[0] if rising else idx[-1]
+    frac = (horizon - el[k]) / (el[k + 1] - el[k])
+    return t[k] + frac * (t[k + 1] - t[k])
+
+
+def _culmination(t, el):
+    """Return (time, elevation) of the fine-grid maximum with a parabolic fit."""
+    k = int(np.argmax(el))
+    if 0 < k < len(el) - 1:
+        y0, y1, y2 = el[k - 1], el[k], el[k + 1]
+        denom = y0 - 2 * y1 + y2
+        if denom < 0:
+            off = 0.5 * (y0 - y2) / denom
+            return t[k] + off * (t[1] - t[0]), y1 - 0.25 * (y0 - y2) * off
+    return t[k], el[k]
+
+
+def _refine_windows(grid, el, lo, hi, horizon):
+    """Fine-grid windows needed to refine the candidate bracket lo..hi."""
+    if hi - lo == 2 and el[lo + 1] <= horizon:
+        # Grazing candidate: the whole pass may sit between two samples.
+        return [(grid[lo], grid[hi])]
+    k = lo + 1 + int(np.argmax(el[lo + 1:hi]))
+    return [(grid[lo], grid[lo + 1]), (grid[max(k - 1, lo)], grid[min(k + 1, hi)]),
+            (grid[hi - 1], grid[hi])]
+
+
+def _refine_pass(fine, horizon):
+    """
+    Turn the evaluated windows of one candidate into (rise, peak, set,
+    max_el), or None when the candidate never clears the horizon.
+    """
+    if len(fine) == 1:
+        (t, el), = fine
+        if el.max() <= horizon:
+            return None
+        rise_w = peak_w = set_w = (t, el)
+    else:
+        rise_w, peak_w, set_w = fine
+    rise = _crossing(*rise_w, horizon, True)
+    set_ = _crossing(*set_w, horizon, False)
+    if rise is None or set_ is None:
+        return None
+    peak, max_el = _culmination(*peak_w)
+    return rise, peak, set_, max_el
+
+
+def _candidates(el, horizon):
+    """
+    Yield (lo, hi) coarse index brackets for every pass fully inside the grid:
+    runs of above-horizon samples, plus near-horizon local maxima that may
+    hide a short grazing pass between two samples.
+    """
+    above = el > horizon
+    edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+    rises = edges[above[edges + 1]]
+    sets = edges[~above[edges + 1]]
+    if len(sets) and (not len(rises) or sets[0] < rises[0]):
+        sets = sets[1:]  # pass already in progress at t0
+    for lo, hi in zip(rises, sets):
+        yield int(lo), int(hi) + 1
+
+    inner = el[1:-1]
+    peaks = np.flatnonzero(
+        (inner >= el[:-2]) & (inner > el[2:]) & ~above[1:-1] & (inner > horizon - GRAZE_MARGIN_DEG)
+    ) + 1
+    for k in peaks:
+        yield int(k) - 1, int(k) + 1
+
+
+def _to_utc(unix_s):
+    return datetime.fromtimestamp(float(unix_s), tz=timezone.utc)
+
+
+def _predict(satellites, observers, t0, t1, horizon_deg, coarse_step_s, chunk_size, track_step_s):
+    """Shared core of predict_passes()/predict_passes_multi(); one pass list per observer."""
+    t0_s, t1_s = t0.timestamp(), t1.timestamp()
+    grid = np.arange(t0_s, t1_s + coarse_step_s, coarse_step_s, dtype=float)
+    grid[-1] = min(grid[-1], t1_s)
+    jd, fr = _jd_split(grid)
+    frames = [observer_frame(lat, lon, alt) for lat, lon, alt in observers]
+    obs_xyz = np.array([f[0] for f in frames])
+    obs_up = np.array([f[1] for f in frames])
+    enus = [observer_enu(lat, lon) for lat, lon, _ in observers]
+    # Keep the (observer, satellite, time) elevation block the same size
+    chunk_size = max(1, chunk_size // len(observers))
+
+    results = [[] for _ in observers]
+    for c in range(0, len(satellites), chunk_size):
+        chunk = satellites[c:c + chunk_size]
+        err, r, _ = SatrecArray([s for _, s in chunk]).sgp4(jd, fr)
+        r_ecef = _teme_to_ecef(r, jd, fr)
+        del r
+        elev = _elevation(r_ecef, err, obs_xyz[:, None, None, :], obs_up[:, None, None, :])
+        del r_ecef
+
+        hits = np.flatnonzero(elev.max(axis=(0, 2)) > horizon_deg - GRAZE_MARGIN_DEG)
+        for i in hits:
+            name, satrec = chunk[i]
+            cands = [(k, _refine_windows(grid, elev[k, i], lo, hi, horizon_deg))
+                     for k in range(len(observers))
+                     for lo, hi in _candidates(elev[k, i], horizon_deg)]
+            if not cands:
+                continue
+            windows = [(a, b, k) for k, cand in cands for a, b in cand]
+            fine = iter(_fine_elevation(satrec, windows, obs_xyz, obs_up))
+            seen, found_passes = set(), [[] for _ in observers]
+            for k, cand in cands:
+                found = _refine_pass([next(fine) for _ in cand], horizon_deg)
+                if not found or (k, round(found[0])) in seen:
+                    continue
+                seen.add((k, round(found[0])))
+                rise, peak, set_, max_el = found
+                found_passes[k].append({
+                    "satellite": name,
+                    "start": _to_utc(rise),
+                    "peak": _to_utc(peak),
+                    "end": _to_utc(set_),
+                    "max_elevation": round(float(max_el), 1)
+                })
+            for k, found in enumerate(found_passes):
+                if track_step_s and found:
+                    spans = [(p["start"].timestamp(), p["end"].timestamp()) for p in found]
+                    tracks = pass_tracks(satrec, spans, obs_xyz[k], enus[k], track_step_s)
+                    for p, track in zip(found, tracks):
+                        p["track"] = track
+                results[k].extend(found)
+
+    for passes in results:
+        passes.sort(key=lambda p: p["start"])
+    return results
+
+
+def predict_passes(satellites, lat, lon, alt, t0, t1, horizon_deg=0.0,
+                   coarse_step_s=COARSE_STEP_S, chunk_size=CHUNK_SIZE, track_step_s=None):
+    """
+    Predict every pass that rises and sets between `t0` and `t1`.
+
+    `satellites` is a sequence of (name, Satrec) pairs. Returns pass dicts
+    with UTC datetimes: satellite, start, peak, end, max_elevation (degrees,
+    rounded to 0.1), sorted by start time. With `track_step_s` set, each
+    pass also carries a "track" sampled at that spacing (see pass_tracks()).
+    """
+    return _predict(satellites, [(lat, lon, alt)], t0, t1, horizon_deg,
+                    coarse_step_s, chunk_size, track_step_s)[0]
+
+
+def predict_passes_multi(satellites, observers, t0, t1, horizon_deg=0.0,
+                         coarse_step_s=COARSE_STEP_S, chunk_size=CHUNK_SIZE, track_step_s=None):
+    """
+    Predict passes for several observers at once. `observers` is a sequence
+    of (lat, lon, alt) tuples; each satellite is propagated once and its
+    elevation evaluated for every observer by broadcasting. Returns one
+    pass list per observer, in order, shaped like predict_passes() output.
+    """
+    if not observers:
+        return []
+    return _predict(satellites, list(observers), t0, t1, horizon_deg,
+                    coarse_step_s, chunk_size, track_step_s)
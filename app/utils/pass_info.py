@@ -1,39 +1,88 @@
-from skyfield.api import Loader, EarthSatellite, wgs84
+from skyfield.api import EarthSatellite, wgs84
 from datetime import datetime
-from zoneinfo import ZoneInfo
 import os
+import numpy as np
+from app.utils.catalog import get_catalog, get_timescale
+from app.utils.tle_store import get_store
 
 TLE_PATH = os.path.join(os.path.dirname(__file__), "..", "static", "tle", "active.txt")
 
 
-def get_iss_info_at(dt: datetime, lat: float, lon: float, alt: float, tz: str = "UTC"):
+def _iss_satellites(catalog, record):
     """
-    Return ISS position (lat, lon), altitude (km), and max elevation at a given datetime.
+    (epochs, satellites) for every distinct ISS TLE in the TLE directory
+    index, oldest first, so past timestamps use the element set nearest them.
+    """
+    rows = get_store(os.path.dirname(catalog.path)).records()
+    rows = rows[rows["norad"] == record["norad"]]
+    epochs, sats = [], []
+    for row in rows:
+        if epochs and row["epoch"] == epochs[-1]:
+            continue
+        l1, l2 = row["line1"].decode(), row["line2"].decode()
+        if l1 == record["line1"]:
+            sat = catalog.earth_satellite(record)
+        else:
+            sat = EarthSatellite(l1, l2, record["name"], get_timescale())
+        epochs.append(float(row["epoch"]))
+        sats.append(sat)
+    if not sats:
+        return np.array([float("nan")]), [catalog.earth_satellite(record)]
+    return np.array(epochs), sats
+
+
+def _nearest(epochs, stamps):
+    """Index of the nearest epoch for each timestamp."""
+    if len(epochs) == 1:
+        return np.zeros(len(stamps), dtype=int)
+    hi = np.clip(np.searchsorted(epochs, stamps), 1, len(epochs) - 1)
+    lo = hi - 1
+    return np.where(stamps - epochs[lo] <= epochs[hi] - stamps, lo, hi)
+
+
+def get_iss_info_batch(dts, lat: float, lon: float, alt: float):
+    """
+    Vectorized get_iss_info_at() for many datetimes: one Skyfield call over
+    a Time array per ISS TLE used. Returns a list of dicts in input order,
+    or None if no ISS TLE is available.
     """
     if not os.path.exists(TLE_PATH):
         return None
-    load = Loader("./skyfield_data")
-    ts = load.timescale()
+    catalog = get_catalog(TLE_PATH)
+    record = catalog.find("ISS")
+    if record is None:
+        return None
+    # naive datetimes are system local time
+    dts = [dt if dt.tzinfo else dt.astimezone() for dt in dts]
+    if not dts:
+        return []
     observer = wgs84.latlon(latitude_degrees=lat, longitude_degrees=lon, elevation_m=alt)
-    with open(TLE_PATH) as f:
-        lines = [line.strip() for line in f if line.strip()]
-    for i in range(0, len(lines), 3):
-        name, l1, l2 = lines[i], lines[i+1], lines[i+2]
-        if "ISS" not in name.upper():
-            continue
-        sat = EarthSatellite(l1, l2, name, ts)
-        t = ts.from_datetime(dt)
-        geo = sat.at(t).subpoint()
-        alt_km = geo.elevation.km
-        iss_lat = geo.latitude.degrees
-        iss_lon = geo.longitude.degrees
-        # Max elevation: compute for observer
-        difference = sat - observer
-        alt_deg = difference.at(t).altaz()[0].degrees
-        return {
-            "iss_lat": iss_lat,
-            "iss_lon": iss_lon,
-            "iss_alt_km": alt_km,
-            "iss_elev_deg": alt_deg
-        }
-    return None
+    epochs, sats = _iss_satellites(catalog, record)
+
+    idx = _nearest(epochs, np.array([dt.timestamp() for dt in dts]))
+
+    results = [None] * len(dts)
+    for k in np.unique(idx):
+        members = np.flatnonzero(idx == k)
+        sat = sats[k]
+        t = get_timescale().from_datetimes([dts[i] for i in members])
+        position = sat.at(t)
+        geo = wgs84.subpoint_of(position)
+        heights = wgs84.height_of(position).km
+        elev = (sat - observer).at(t).altaz()[0].degrees
+        for j, i in enumerate(members):
+            results[i] = {
+                "iss_lat": float(geo.latitude.degrees[j]),
+                "iss_lon": float(geo.longitude.degrees[j]),
+                "iss_alt_km": float(heights[j]),
+                "iss_elev_deg": float(elev[j])
+            }
+    return results
+
+
+def get_iss_info_at(dt: datetime, lat: float, lon: float, alt: float, tz: str = "UTC"):
+    """
+    Return ISS position (lat, lon), altitude (km), and max elevation at a given datetime.
+    """
+    info = get_iss_info_batch([dt], lat, lon, alt)
+    return info[0] if info else None
@@ -0,0 +1,188 @@
+"""
+pass_selection.py — choose which predicted passes the SDRs should record.
+
+Passes compete for a limited number of dongles, so not every overlapping
+pass can be captured. Selection is weighted interval scheduling: every
+pass gets a score (max elevation, duration, satellite priority, known
+SSTV event windows) and dynamic programming picks the non-overlapping
+subset with the highest total, once per dongle. A satellite with several
+downlinks is recorded on one dongle per downlink, so its passes hold that
+many dongles at once. Each capture window is padded for start-up, run-out
+and the time needed to retune and settle between captures. Every pass that is not
+selected comes back with the reason it was dropped.
+
+Configured under "pass_selection" in settings.json, e.g.
+
+    "pass_selection": {
+        "weights": {"base": 1, "elevation": 2, "duration": 1, "priority": 1, "event": 10},
+        "priority": {"ISS": 2},
+        "events": [{"satellite": "ISS", "start": "2026-10-20T09:00:00+00:00",
+                    "end": "2026-10-22T18:00:00+00:00"}],
+        "settle_s": 10
+    }
+"""
+
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+
+from app.utils.config_store import settings as settings_store
+from app.utils.tle import downlinks_hz
+from app.utils.tle_store import normalize_name
+
+DEFAULT_WEIGHTS = {
+    "base": 1.0,        # every recordable pass is worth something
+    "elevation": 2.0,   # per 90° of max elevation
+    "duration": 1.0,    # per 10 minutes above the horizon
+    "priority": 1.0,    # per unit of satellite priority
+    "event": 10.0,      # pass falls inside a known SSTV event window
+}
+DEFAULT_SETTLE_S = 10
+
+
+def load_selection_settings():
+    """The "pass_selection" block of settings.json with defaults filled in."""
+    cfg = settings_store.get("pass_selection") or {}
+    events = []
+    for ev in cfg.get("events", []):
+        try:
+            events.append({
+                "satellite": ev.get("satellite"),
+                "start": _aware(datetime.fromisoformat(ev["start"])),
+                "end": _aware(datetime.fromisoformat(ev["end"]))
+            })
+        except (KeyError, TypeError, ValueError):
+            print(f"⚠ Ignoring malformed SSTV event window: {ev}")
+    return {
+        "weights": {**DEFAULT_WEIGHTS, **cfg.get("weights", {})},
+        "priority": {normalize_name(k): float(v) for k, v in cfg.get("priority", {}).items()},
+        "events": events,
+        "settle_s": float(cfg.get("settle_s", DEFAULT_SETTLE_S))
+    }
+
+
+def _aware(dt):
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def matches_satellite(satellite, name):
+    """Exact (normalized) name or first-word match, as for downlink lookups."""
+    sat = normalize_name(satellite)
+    name = normalize_name(name)
+    return sat == name or sat.split(" ")[0] == name
+
+
+def satellite_priority(satellite, priorities):
+    for name, value in priorities.items():
+        if matches_satellite(satellite, name):
+            return value
+    return 0.0
+
+
+def in_event(p, events):
+    """True if the pass overlaps an SSTV event window for its satellite."""
+    return any(
+        (not ev["satellite"] or matches_satellite(p["satellite"], ev["satellite"]))
+        and p["start"] < ev["end"] and p["end"] > ev["start"]
+        for ev in events
+    )
+
+
+def score_pass(p, settings):
+    w = settings["weights"]
+    duration = (p["end"] - p["start"]).total_seconds()
+    return (w["base"]
+            + w["elevation"] * p["max_elevation"] / 90.0
+            + w["duration"] * duration / 600.0
+            + w["priority"] * satellite_priority(p["satellite"], settings["priority"])
+            + w["event"] * in_event(p, settings["events"]))
+
+
+def _fmt(p):
+    return f"{p['satellite']} {p['start']:%H:%M:%S}–{p['end']:%H:%M:%S}"
+
+
+def _conflicts(a, b, gap):
+    return b["start"] - gap < a["end"] and a["start"] < b["end"] + gap
+
+
+def _best_subset(cands, gap):
+    """Weighted interval scheduling over `cands` (sorted by end): the best compatible subset."""
+    ends = [p["end"] for p in cands]
+    # best[i]: best total over the first i passes (by end time)
+    best, take = [0.0], []
+    for i, p in enumerate(cands):
+        j = bisect_right(ends, p["start"] - gap, 0, i)  # passes that finish in time
+        with_p = best[j] + p["score"]
+        take.append((with_p > best[i], j))
+        best.append(max(with_p, best[i]))
+
+    selected, i = [], len(cands)
+    while i > 0:
+        chosen, j = take[i - 1]
+        if chosen:
+            selected.append(cands[i - 1])
+            i = j
+        else:
+            i -= 1
+    selected.reverse()
+    return selected
+
+
+def select_passes(passes, settings=None, pad_before=0, pad_after=0, devices=1):
+    """
+    Pick the highest-scoring set of passes that `devices` SDRs can record.
+    A capture occupies [start - pad_before, end + pad_after] and the next
+    one on the same dongle may begin `settle_s` after it ends. With several
+    dongles, each takes the best schedule from the passes the previous ones
+    left over; a pass needing k dongles (one per downlink) chosen for slot
+    s also holds its window on slots s+1 .. s+k-1.
+
+    Passes of satellites without a downlink are never recorded; callers
+    filter them out, and any left are ignored rather than reported.
+
+    Returns (selected, dropped): selected pass dicts in start order, each
+    with a "score", "dongles" and "device_slot"; dropped as
+    {"pass", "score", "reason"}.
+    """
+    settings = settings or load_selection_settings()
+    gap = timedelta(seconds=pad_before + pad_after + settings["settle_s"])
+    devices = max(1, devices)
+
+    dropped, cands = [], []
+    for p in passes:
+        dongles = len(downlinks_hz(p["satellite"]))
+        if not dongles:
+            continue
+        score = round(score_pass(p, settings), 3)
+        if dongles > devices:
+            dropped.append({"pass": p, "score": score,
+                            "reason": f"needs {dongles} SDRs, {devices} available"})
+            continue
+        cands.append({**p, "score": score, "dongles": dongles})
+    cands.sort(key=lambda p: p["end"])
+
+    selected = []
+    held = [[] for _ in range(devices)]  # windows held on each slot by multi-downlink passes
+    for slot in range(devices):
+        fits = [p for p in cands if slot + p["dongles"] <= devices
+                and not any(_conflicts(p, h, gap) for h in held[slot])]
+        chosen = _best_subset(fits, gap)
+        chosen_ids = {id(p) for p in chosen}
+        for p in chosen:
+            p["device_slot"] = slot
+            for extra in range(slot + 1, slot + p["dongles"]):
+                held[extra].append(p)
+        selected.extend(chosen)
+        cands = [p for p in cands if id(p) not in chosen_ids]
+    selected.sort(key=lambda p: p["start"])
+
+    for p in cands:
+        rivals = [s for s in selected if _conflicts(p, s, gap)]
+        if rivals:
+            reason = "conflicts with " + ", ".join(f"{_fmt(s)} (score {s['score']})" for s in rivals)
+        else:
+            reason = "score does not justify the slot"
+        dropped.append({"pass": {k: v for k, v in p.items() if k not in ("score", "dongles")},
+                        "score": p["score"], "reason": reason})
+    dropped.sort(key=lambda d: d["pass"]["start"])
+    return selected, dropped
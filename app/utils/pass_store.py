@@ -0,0 +1,254 @@
+"""
+pass_store.py — indexed SQLite store for predicted passes.
+
+Replaces re-reading predicted_passes.csv on every page render, timeline poll
+and diagnostics check. Passes are indexed on AOS and (satellite, AOS) so the
+common questions — next N passes, passes overlapping a window, passes for one
+satellite — are range queries. A refresh builds a new database file next to
+the old one and renames it into place, so readers always see either the old
+or the new pass set. The rolling prediction cache state lives in the `meta`
+table of the same file; CSV remains available through export_csv().
+
+Each pass can also carry its sampled track (see pass_engine.pass_tracks),
+stored as one float32 blob of TRACK_FIELDS columns per pass.
+"""
+
+import csv
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+PASS_DB = Path("predicted_passes.db")
+TRACK_FIELDS = ("az", "el", "range_km", "range_rate_km_s", "doppler_hz", "lat", "lon")
+
+SCHEMA = """
+CREATE TABLE passes (
+    id INTEGER PRIMARY KEY,
+    satellite TEXT NOT NULL,
+    aos REAL NOT NULL,
+    peak REAL NOT NULL,
+    los REAL NOT NULL,
+    max_elev REAL NOT NULL
+);
+CREATE INDEX idx_passes_aos ON passes(aos);
+CREATE INDEX idx_passes_sat_aos ON passes(satellite, aos);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE tracks (
+    pass_id INTEGER PRIMARY KEY REFERENCES passes(id),
+    t0 REAL NOT NULL,
+    step REAL NOT NULL,
+    n INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+"""
+
+# Tracks of passes carried over from the previous store, matched on (satellite, AOS)
+COPY_TRACKS = """
+INSERT INTO tracks (pass_id, t0, step, n, data)
+SELECT p.id, t.t0, t.step, t.n, t.data
+FROM passes p
+JOIN old.passes op ON op.satellite = p.satellite AND op.aos = p.aos
+JOIN old.tracks t ON t.pass_id = op.id
+WHERE p.id NOT IN (SELECT pass_id FROM tracks)
+"""
+
+
+def _ts(dt):
+    return dt.timestamp()
+
+
+def _dt(ts):
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _row_to_pass(row):
+    return {
+        "id": row[0],
+        "satellite": row[1],
+        "start": _dt(row[2]),
+        "peak": _dt(row[3]),
+        "end": _dt(row[4]),
+        "max_elevation": row[5]
+    }
+
+
+def _connect(path=None):
+    """Read-only connection, or None when no pass store has been written yet."""
+    path = Path(path or PASS_DB)
+    if not path.exists():
+        return None
+    return sqlite3.connect(f"file:{path.resolve()}?mode=ro", uri=True)
+
+
+def _query(sql, params=(), path=None):
+    conn = _connect(path)
+    if conn is None:
+        return []
+    try:
+        return [_row_to_pass(r) for r in conn.execute(sql, params)]
+    except sqlite3.Error:
+        return []
+    finally:
+        conn.close()
+
+
+def version(path=None):
+    """(mtime_ns, size) of the store file; changes on every replace. None if absent."""
+    try:
+        st = os.stat(path or PASS_DB)
+        return st.st_mtime_ns, st.st_size
+    except FileNotFoundError:
+        return None
+
+
+def _pack_track(track):
+    cols = [np.asarray(track.get(k, np.full(len(track["el"]), np.nan)), dtype=np.float32)
+            for k in TRACK_FIELDS]
+    return track["t0"], track["step"], len(cols[0]), np.stack(cols, axis=1).tobytes()
+
+
+def replace_passes(passes, meta=None, path=None):
+    """
+    Atomically replace the stored pass set. `passes` are pass dicts with
+    satellite/start/peak/end/max_elevation and optionally a "track"; passes
+    without one keep the track stored for the same satellite and AOS in the
+    current store. `meta` is a dict of strings.
+    """
+    path = Path(path or PASS_DB)
+    fd, tmp = tempfile.mkstemp(dir=path.resolve().parent, prefix=".passes.", suffix=".db")
+    os.close(fd)
+    try:
+        passes = sorted(passes, key=lambda p: p["start"])
+        conn = sqlite3.connect(tmp)
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.executemany(
+                "INSERT INTO passes (id, satellite, aos, peak, los, max_elev) VALUES (?, ?, ?, ?, ?, ?)",
+                [(i, p["satellite"], _ts(p["start"]), _ts(p["peak"]), _ts(p["end"]), p["max_elevation"])
+                 for i, p in enumerate(passes, 1)]
+            )
+            conn.executemany(
+                "INSERT INTO tracks (pass_id, t0, step, n, data) VALUES (?, ?, ?, ?, ?)",
+                [(i, *_pack_track(p["track"])) for i, p in enumerate(passes, 1) if p.get("track")]
+            )
+            longest = max((_ts(p["end"]) - _ts(p["start"]) for p in passes), default=0)
+            rows = dict(meta or {}, max_duration_s=str(longest))
+            conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", rows.items())
+        if path.exists():
+            conn.execute("ATTACH DATABASE ? AS old", (str(path.resolve()),))
+            try:
+                with conn:
+                    conn.execute(COPY_TRACKS)
+            except sqlite3.Error:
+                pass  # store written before tracks existed
+            conn.execute("DETACH DATABASE old")
+        conn.close()
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def get_meta(path=None):
+    conn = _connect(path)
+    if conn is None:
+        return {}
+    try:
+        return dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+
+def all_passes(path=None):
+    """Every stored pass, ordered by AOS."""
+    return _query("SELECT id, satellite, aos, peak, los, max_elev FROM passes ORDER BY aos", path=path)
+
+
+def next_passes(n=10, after=None, path=None):
+    """The next `n` passes with AOS at or after `after` (default now)."""
+    after = after or datetime.now(timezone.utc)
+    return _query(
+        "SELECT id, satellite, aos, peak, los, max_elev FROM passes WHERE aos >= ? ORDER BY aos LIMIT ?",
+        (_ts(after), n), path
+    )
+
+
+def passes_overlapping(t0, t1, path=None):
+    """Passes that are above the horizon at any time in [t0, t1]."""
+    # Bounding AOS by the longest stored pass keeps the query on the AOS index
+    longest = float(get_meta(path).get("max_duration_s", 0) or 0)
+    return _query(
+        "SELECT id, satellite, aos, peak, los, max_elev FROM passes "
+        "WHERE aos BETWEEN ? AND ? AND los >= ? ORDER BY aos",
+        (_ts(t0) - longest, _ts(t1), _ts(t0)), path
+    )
+
+
+def passes_for_satellite(satellite, after=None, limit=None, path=None):
+    """Passes of one satellite, optionally only those with AOS after `after`."""
+    after = after or datetime.fromtimestamp(0, tz=timezone.utc)
+    return _query(
+        "SELECT id, satellite, aos, peak, los, max_elev FROM passes "
+        "WHERE satellite = ? AND aos >= ? ORDER BY aos LIMIT ?",
+        (satellite, _ts(after), -1 if limit is None else limit), path
+    )
+
+
+def get_pass(pass_id, path=None):
+    rows = _query("SELECT id, satellite, aos, peak, los, max_elev FROM passes WHERE id = ?",
+                  (pass_id,), path)
+    return rows[0] if rows else None
+
+
+def get_track(pass_id, satellite=None, aos=None, path=None):
+    """
+    Stored track of a pass as {"t0", "step", "t", <TRACK_FIELDS arrays>},
+    where `t` is unix seconds per sample; None if the pass has no track.
+
+    Pass ids are renumbered on every replace, so callers holding an id
+    from an earlier read should pass the `satellite` and `aos` (datetime)
+    they expect: if the id now belongs to another pass, None is returned.
+    """
+    conn = _connect(path)
+    if conn is None:
+        return None
+    try:
+        row = conn.execute("SELECT p.satellite, p.aos, t.t0, t.step, t.n, t.data "
+                           "FROM tracks t JOIN passes p ON p.id = t.pass_id WHERE t.pass_id = ?",
+                           (pass_id,)).fetchone()
+    except sqlite3.Error:
+        row = None
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    stored_sat, stored_aos, t0, step, n, data = row
+    if satellite is not None and stored_sat != satellite:
+        return None
+    if aos is not None and abs(stored_aos - _ts(aos)) > 1e-3:
+        return None
+    cols = np.frombuffer(data, dtype=np.float32).reshape(n, len(TRACK_FIELDS))
+    track = {"t0": t0, "step": step, "t": t0 + step * np.arange(n)}
+    track.update({k: cols[:, i] for i, k in enumerate(TRACK_FIELDS)})
+    return track
+
+
+def export_csv(out, path=None):
+    """Write stored passes as predicted_passes.csv-style rows to a text file object."""
+    writer = csv.writer(out)
+    writer.writerow(["satellite", "aos", "los", "max_elev"])
+    for p in all_passes(path):
+        writer.writerow([
+            p["satellite"],
+            p["start"].isoformat(timespec="seconds"),
+            p["end"].isoformat(timespec="seconds"),
+            p["max_elevation"]
+        ])
@@ -1,80 +1,221 @@
-from skyfield.api import Loader, EarthSatellite, wgs84
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-import csv
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import hashlib
+import heapq
 import os
+from app.utils.pass_engine import predict_passes_multi, TRACK_STEP_S
+from app.utils.catalog import get_catalog
+from app.utils import pass_store, tle as tle_utils
+from app.utils.config_store import settings
 
-PASS_FILE = Path("predicted_passes.csv")
+MIN_SHARD_SIZE = 100  # below this many satellites per worker, stay serial
+# Minimum re-predicted overlap when the window is rolled forward; it grows
+# to the longest stored pass so slow high-orbit passes that straddle the
+# old window end are found again (see seam_overlap()).
+SEAM_OVERLAP = timedelta(minutes=30)
+SPEED_OF_LIGHT_KM_S = 299792.458
 
-def save_predicted_passes(passes):
-    """Write passes to predicted_passes.csv for the scheduler."""
-    with PASS_FILE.open("w", newline="") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["satellite", "aos", "los", "max_elev"])
-        for p in passes:
-            writer.writerow([
-                p["satellite"],
-                p["start"].astimezone(ZoneInfo("UTC")).isoformat(timespec="seconds"),
-                p["end"].astimezone(ZoneInfo("UTC")).isoformat(timespec="seconds"),
-                p["max_elevation"]
-            ])
+def prediction_workers():
+    """Worker count for parallel prediction: settings.json `prediction_workers`, else CPU count."""
+    try:
+        workers = settings.get("prediction_workers")
+        if workers:
+            return max(1, int(workers))
+    except (TypeError, ValueError):
+        pass
+    return os.cpu_count() or 1
 
-def generate_predictions(lat, lon, alt, tz, tle_path, hours: int = 48):
+def track_step():
+    """Track sample spacing in seconds: settings.json `track_step_s`, else TRACK_STEP_S; 0 disables tracks."""
+    try:
+        step = settings.get("track_step_s")
+        if step is not None:
+            return max(0.0, float(step))
+    except (TypeError, ValueError):
+        pass
+    return TRACK_STEP_S
+
+def _predict_shard(shard, tle_path, shards, observers, t0, t1, track_step_s=None):
+    """
+    Process-pool entry point: predict passes for every `shards`-th satellite
+    of the catalog, starting at `shard`. Each worker keeps its own catalog.
+    """
+    sats = get_catalog(tle_path).satrecs()[shard::shards]
+    return predict_passes_multi(sats, observers, t0, t1, track_step_s=track_step_s)
+
+def predict_network(catalog, observers, t0, t1, workers=1, track_step_s=None):
+    """
+    Predict passes of a SatelliteCatalog for several (lat, lon, alt)
+    observers, returning one UTC pass list per observer. Each satellite is
+    propagated once for all observers. The catalog is sharded across
+    `workers` processes; small catalogs, a single worker, or a pool that
+    cannot be started fall back to serial prediction.
+    """
+    sats = catalog.satrecs()
+    workers = min(workers, len(sats) // MIN_SHARD_SIZE)
+    if workers > 1:
+        # Interleaved shards give each worker a similar mix of orbits
+        shard_fn = partial(_predict_shard, tle_path=catalog.path, shards=workers,
+                           observers=observers, t0=t0, t1=t1, track_step_s=track_step_s)
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(shard_fn, range(workers)))
+            return [list(heapq.merge(*per_obs, key=lambda p: p["start"]))
+                    for per_obs in zip(*results)]
+        except Exception as e:
+            print(f"⚠ Parallel prediction failed, falling back to serial: {e}")
+    return predict_passes_multi(sats, observers, t0, t1, track_step_s=track_step_s)
+
+def predict_parallel(catalog, lat, lon, alt, t0, t1, workers=1, track_step_s=None):
+    """Single-observer predict_network()."""
+    return predict_network(catalog, [(lat, lon, alt)], t0, t1, workers, track_step_s)[0]
+
+def add_doppler(passes):
+    """
+    Add a "doppler_hz" array to each pass track: the shift at the
+    satellite's downlink (tle.DOWNLINK_HZ). Satellites without a downlink
+    are never recorded, so their passes drop the track rather than filling
+    the pass store with samples nothing reads.
     """
-    Generate passes for the next `hours` and save to predicted_passes.csv.
-    Default horizon is 48 hours.
+    for p in passes:
+        track = p.get("track")
+        if track is None:
+            continue
+        freq = tle_utils.downlink_hz(p["satellite"])
+        if not freq:
+            del p["track"]
+            continue
+        rr = track["range_rate_km_s"]
+        track["doppler_hz"] = (-rr / SPEED_OF_LIGHT_KM_S * freq).astype(rr.dtype)
+    return passes
+
+def _cache_key(tle_sha256, lat, lon, alt):
+    """Hash of TLE content plus observer location; any change invalidates the cache."""
+    h = hashlib.sha256(tle_sha256.encode())
+    h.update(f"|{float(lat):.6f},{float(lon):.6f},{float(alt):.1f}".encode())
+    return h.hexdigest()
+
+def _load_cache():
+    """Return {"key", "covered_until", "passes"} from the pass store, or None."""
+    meta = pass_store.get_meta()
+    if not meta.get("key") or not meta.get("covered_until"):
+        return None
+    return {
+        "key": meta["key"],
+        "covered_until": datetime.fromisoformat(meta["covered_until"]),
+        "max_duration_s": float(meta.get("max_duration_s") or 0),
+        "passes": pass_store.all_passes()
+    }
+
+def seam_overlap(cache):
+    """
+    How far before the old window end to predict again. Prediction only
+    returns passes that rise and set inside the window, so a pass up at
+    the old end was not stored; it rose at most one pass length before it.
+    """
+    return max(SEAM_OVERLAP, timedelta(seconds=cache["max_duration_s"]))
+
+def _save_cache(key, covered_until, passes):
+    try:
+        pass_store.replace_passes(passes, {"key": key, "covered_until": covered_until.isoformat()})
+    except Exception as e:
+        print(f"⚠ Could not write pass store: {e}")
+
+_cached = {"stamp": None, "passes": []}
+
+def cached_predictions():
+    """
+    Return (version, passes) from the pass store without predicting anything.
+    Passes carry UTC datetimes and are sorted by start; the store is only
+    re-read when it has been replaced. `version` is None when no predictions
+    have been generated yet.
+    """
+    stamp = pass_store.version()
+    if stamp is None:
+        return None, []
+    if stamp != _cached["stamp"]:
+        _cached.update(stamp=stamp, passes=pass_store.all_passes())
+    return _cached["stamp"], _cached["passes"]
+
+def rolling_predictions(catalog, lat, lon, alt, now_utc, end_utc, workers=1, key=None):
+    """
+    Return UTC passes for [now_utc, end_utc], reusing the cached window when
+    `key` matches: passes that have ended are dropped and only the newly
+    uncovered tail (plus seam_overlap()) is predicted. Newly predicted passes
+    carry a track (see track_step()); reused ones keep theirs in the pass store.
+    """
+    predict = partial(predict_parallel, catalog, lat, lon, alt, workers=workers,
+                      track_step_s=track_step() or None)
+    cache = _load_cache() if key else None
+    if cache and cache["key"] == key and cache["covered_until"] - seam_overlap(cache) > now_utc:
+        covered = cache["covered_until"]
+        boundary = covered - seam_overlap(cache)
+        if end_utc <= covered:
+            raw = [p for p in cache["passes"] if p["end"] > now_utc]
+        else:
+            kept = [p for p in cache["passes"] if p["end"] > now_utc and p["start"] < boundary]
+            raw = kept + add_doppler(predict(boundary, end_utc))
+            covered = end_utc
+    else:
+        raw = add_doppler(predict(now_utc, end_utc))
+        covered = end_utc
+
+    if key:
+        _save_cache(key, covered, raw)
+    return [p for p in raw if p["end"] <= end_utc]
+
+def generate_predictions(lat, lon, alt, tz, tle_path, hours: int = 48, workers: int = 1):
+    """
+    Generate passes for the next `hours` and save them to the pass store.
+    Default horizon is 48 hours. `workers` > 1 shards the catalog across
+    that many processes (see prediction_workers()). Results are cached per
+    TLE content and location, so repeated calls only predict the part of
+    the window that was not covered before.
     """
     passes = []
     if None in (lat, lon, alt, tz) or not tle_path or not os.path.exists(tle_path):
         return passes
 
-    load = Loader("./skyfield_data")
-    ts = load.timescale()
-    observer = wgs84.latlon(latitude_degrees=lat, longitude_degrees=lon, elevation_m=alt)
-
-    with open(tle_path) as f:
-        lines = [line.strip() for line in f if line.strip()]
-
+    catalog = get_catalog(tle_path)
+    catalog.records()  # revalidate against the file before hashing
     now_utc = datetime.now(timezone.utc)
     end_utc = now_utc + timedelta(hours=hours)
-    t0, t1 = ts.from_datetime(now_utc), ts.from_datetime(end_utc)
+    zone = ZoneInfo(tz)
+    key = _cache_key(catalog.sha256, lat, lon, alt)
 
-    for i in range(0, len(lines), 3):
-        try:
-            name, l1, l2 = lines[i], lines[i+1], lines[i+2]
-            sat = EarthSatellite(l1, l2, name, ts)
-            times, events = sat.find_events(observer, t0, t1, altitude_degrees=0.0)
-        except Exception:
-            continue
-
-        for j in range(0, len(events) - 2, 3):
-            if list(events[j:j+3]) == [0, 1, 2]:
-                start = times[j].utc_datetime().replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo(tz))
-                peak  = times[j+1].utc_datetime().replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo(tz))
-                end   = times[j+2].utc_datetime().replace(tzinfo=ZoneInfo("UTC")).astimezone(ZoneInfo(tz))
-                peak_time = ts.from_datetime(times[j+1].utc_datetime())
-                alt_deg = (sat - observer).at(peak_time).altaz()[0].degrees
-                passes.append({
-                    "satellite": name,
-                    "start": start,
-                    "peak": peak,
-                    "end": end,
-                    "max_elevation": round(alt_deg, 1)
-                })
+    for p in rolling_predictions(catalog, lat, lon, alt, now_utc, end_utc, workers, key):
+        passes.append({
+            **{k: v for k, v in p.items() if k != "track"},
+            "start": p["start"].astimezone(zone),
+            "peak": p["peak"].astimezone(zone),
+            "end": p["end"].astimezone(zone)
+        })
 
     passes.sort(key=lambda p: p["start"])
-    save_predicted_passes(passes)
     return passes
 
-def load_predictions():
-    """Read predicted_passes.csv and return a list of dicts with keys: satellite, aos, los, max_elev."""
-    if not PASS_FILE.exists():
-        return []
-    passes = []
-    with PASS_FILE.open() as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            passes.append(row)
-    return passes
-    
+def generate_network_predictions(observers, tle_path, hours: int = 48, workers: int = 1):
+    """
+    Predict the next `hours` of passes for a network of stations in one
+    batched run. `observers` are dicts with name, latitude, longitude and
+    optionally altitude (m) and timezone (default UTC). Returns
+    {name: passes} with times in each station's timezone. Nothing is
+    written to the local pass store.
+    """
+    if not observers or not tle_path or not os.path.exists(tle_path):
+        return {}
+    now_utc = datetime.now(timezone.utc)
+    sites = [(float(o["latitude"]), float(o["longitude"]), float(o.get("altitude") or 0))
+             for o in observers]
+    results = predict_network(get_catalog(tle_path), sites, now_utc,
+                              now_utc + timedelta(hours=hours), workers)
+    network = {}
+    for obs, passes in zip(observers, results):
+        zone = ZoneInfo(obs.get("timezone") or "UTC")
+        network[obs["name"]] = [
+            {**p, **{k: p[k].astimezone(zone) for k in ("start", "peak", "end")}}
+            for p in passes
+        ]
+    return network
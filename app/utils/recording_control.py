@@ -1,31 +1,25 @@
 from flask import Blueprint, jsonify
-import json
+import os
+import signal
 import subprocess
 import psutil
 from pathlib import Path
+from app.utils import scheduler_control
+from app.utils.config_store import settings as settings_store
 
 recordings_bp = Blueprint('recordings', __name__)
 
-SETTINGS_FILE = Path("settings.json")
 SCHEDULER_SCRIPT = Path("app/utils/sdr_scheduler.py")
 
 def load_settings():
-    if SETTINGS_FILE.exists():
-        return json.loads(SETTINGS_FILE.read_text())
-    return {"recording_enabled": False}
+    return settings_store.get()
 
 def save_settings(settings):
-    SETTINGS_FILE.write_text(json.dumps(settings))
+    settings_store.update(settings)
 
 def find_scheduler_pid():
-    """Find running scheduler process PID if any."""
-    for proc in psutil.process_iter(['pid', 'cmdline']):
-        try:
-            if proc.info['cmdline'] and "sdr_scheduler.py" in " ".join(proc.info['cmdline']):
-                return proc.info['pid']
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return None
+    """PID of the running scheduler (from its PID lock file), if any."""
+    return scheduler_control.scheduler_pid()
 
 @recordings_bp.route("/enable", methods=["POST"])
 def enable_recordings():
@@ -58,7 +52,8 @@ def disable_recordings():
 
     pid = find_scheduler_pid()
     if pid:
-        psutil.Process(pid).terminate()
+        if not scheduler_control.send_command("disable"):
+            os.kill(pid, signal.SIGTERM)
         return jsonify({"status": "disabled", "pid": pid}), 200
     return jsonify({"status": "disabled", "pid": None}), 200
 
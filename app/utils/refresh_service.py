@@ -0,0 +1,114 @@
+"""
+refresh_service.py — background TLE/prediction refresh jobs for the web app.
+
+Routes submit work here and return a job ID immediately instead of doing the
+Celestrak download and pass prediction inside the HTTP request. Submissions
+of a kind that is already queued or running collapse onto the in-flight job
+(single-flight), so double clicks and concurrent pages share one refresh.
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from app.utils import passes as passes_utils, scheduler_control, tle as tle_utils
+from app.utils.config_store import user_config
+
+MAX_JOBS = 50  # finished jobs kept for polling
+
+_lock = threading.Lock()
+_jobs = OrderedDict()
+_inflight = {}
+
+
+class RefreshJob:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.submitted = datetime.now()
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "submitted": self.submitted.isoformat(timespec="seconds"),
+            "finished": self.finished.isoformat(timespec="seconds") if self.finished else None
+        }
+
+
+def _run(job, fn, args):
+    job.status = "running"
+    try:
+        job.result = fn(*args)
+        job.status = "done"
+    except Exception as e:
+        job.error = str(e)
+        job.status = "error"
+    finally:
+        job.finished = datetime.now()
+        with _lock:
+            if _inflight.get(job.kind) is job:
+                del _inflight[job.kind]
+        job.done.set()
+
+
+def submit(kind, fn, *args):
+    """Start `fn(*args)` in the background, or return the in-flight job of the same kind."""
+    with _lock:
+        job = _inflight.get(kind)
+        if job is not None:
+            return job
+        job = RefreshJob(kind)
+        _inflight[kind] = job
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    threading.Thread(target=_run, args=(job, fn, args), daemon=True).start()
+    return job
+
+
+def get_job(job_id):
+    with _lock:
+        return _jobs.get(job_id)
+
+
+def wait_for(job_id, timeout):
+    """Block up to `timeout` seconds for a job to finish; returns the job or None."""
+    job = get_job(job_id)
+    if job is not None and timeout > 0:
+        job.done.wait(timeout)
+    return job
+
+
+def refresh_tle_and_predictions():
+    """Conditionally refresh TLEs, then roll the 48 h pass predictions forward."""
+    tle_updated = tle_utils.refresh_tle_file()
+
+    cfg = user_config.get()
+    if not cfg.get("latitude") or not cfg.get("longitude"):
+        print("⚠ No location set — skipping prediction refresh.")
+        return {"tle_updated": tle_updated, "passes": None}
+
+    passes = passes_utils.generate_predictions(
+        cfg["latitude"], cfg["longitude"], cfg.get("altitude", 0),
+        cfg.get("timezone", "UTC"), "app/static/tle/active.txt",
+        workers=passes_utils.prediction_workers()
+    )
+    print(f"📅 Pass predictions updated — {len(passes)} passes.")
+    # Have a running scheduler reschedule its captures from the new predictions
+    scheduler_control.send_command("refresh", fetch_tle=False)
+    return {"tle_updated": tle_updated, "passes": len(passes)}
+
+
+def submit_refresh():
+    """Queue (or join) the shared TLE + prediction refresh job."""
+    return submit("tle_refresh", refresh_tle_and_predictions)
@@ -0,0 +1,128 @@
+"""
+scheduler_control.py — Unix-socket control/status API for the SDR scheduler.
+
+The scheduler holds an exclusive lock on scheduler.pid for its lifetime
+and serves newline-delimited JSON on scheduler.sock: each request is
+{"cmd": "...", ...} and gets one JSON reply. The web app asks the socket
+for status (and sends enable/disable/refresh) instead of scanning every
+process on the host or waiting for the scheduler to notice settings.json.
+
+Commands: status, current_pass, enable, disable, refresh.
+"""
+
+import fcntl
+import json
+import os
+import socket
+import socketserver
+import threading
+from pathlib import Path
+
+SOCKET_PATH = Path("scheduler.sock")
+PID_FILE = Path("scheduler.pid")
+CLIENT_TIMEOUT_S = 2.0
+
+_lock_file = None
+
+
+def acquire_pid_lock(path=None):
+    """
+    Take the scheduler PID lock and write our PID into it. Returns False if
+    another live scheduler holds it. The lock is released when the process
+    exits, so a crashed scheduler never leaves a stale lock behind.
+    """
+    global _lock_file
+    path = Path(path or PID_FILE)
+    f = open(path, "a+")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    _lock_file = f
+    return True
+
+
+def scheduler_pid(path=None):
+    """PID of the live scheduler holding the lock, or None (no file or stale file)."""
+    path = Path(path or PID_FILE)
+    try:
+        with open(path) as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except OSError:
+                return int(f.read().strip() or 0) or None
+            fcntl.flock(f, fcntl.LOCK_UN)
+            return None  # nobody holds the lock: stale
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                fn = self.server.commands.get(request.get("cmd"))
+                if fn is None:
+                    reply = {"ok": False, "error": f"unknown command {request.get('cmd')!r}"}
+                else:
+                    reply = {"ok": True, **(fn(request) or {})}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(reply, default=str).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(commands, path=None):
+    """
+    Serve `commands` ({name: fn(request) -> dict}) on the control socket
+    from a daemon thread. Returns the server; call server.shutdown() and
+    remove the socket on exit (see close()).
+    """
+    path = Path(path or SOCKET_PATH)
+    try:
+        path.unlink()  # left over from a scheduler that died; we hold the PID lock
+    except FileNotFoundError:
+        pass
+    server = _Server(str(path), _Handler)
+    server.commands = commands
+    os.chmod(path, 0o660)
+    threading.Thread(target=server.serve_forever, name="scheduler-control", daemon=True).start()
+    return server
+
+
+def close(server, path=None):
+    """Stop serving and remove the socket file."""
+    server.shutdown()
+    server.server_close()
+    try:
+        Path(path or SOCKET_PATH).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def send_command(cmd, path=None, timeout=CLIENT_TIMEOUT_S, **args):
+    """Send one command to the scheduler; returns its reply, or None if no scheduler is listening."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(str(path or SOCKET_PATH))
+            s.sendall(json.dumps({"cmd": cmd, **args}).encode() + b"\n")
+            buf = b""
+            while not buf.endswith(b"\n"):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                buf += chunk
+        return json.loads(buf) if buf else None
+    except (OSError, ValueError):
+        return None
@@ -1,8 +1,15 @@
 """
-sdr.py — RTL-SDR detection utilities
+sdr.py — RTL-SDR detection utilities and the dongle pool used for captures
 """
 
+import re
 import subprocess
+import threading
+
+from app.utils import config_store
+
+# "  0:  Realtek, RTL2838UHIDIR, SN: 00000001" in `rtl_test -t` output
+DEVICE_LINE = re.compile(r"^\s+(\d+):\s+(.*?)(?:,\s*SN:\s*(\S*))?\s*$")
 
 
 def rtl_sdr_present() -> bool:
@@ -37,10 +44,111 @@ def sdr_exists() -> bool:
     return rtl_sdr_present()
 
 
+def list_devices():
+    """
+    Enumerate connected dongles as [{"index", "name", "serial"}] from the
+    device list `rtl_test -t` prints. The list is printed even when a
+    dongle is busy, so this also works while captures are running.
+    """
+    try:
+        result = subprocess.run(["rtl_test", "-t"], capture_output=True, text=True, timeout=5)
+    except (FileNotFoundError, subprocess.SubprocessError):
+        return []
+    devices, listing = [], False
+    for line in (result.stdout + result.stderr).splitlines():
+        if re.match(r"Found \d+ device\(s\)", line):
+            listing = True
+            continue
+        m = DEVICE_LINE.match(line) if listing else None
+        if m:
+            devices.append({"index": int(m.group(1)), "name": m.group(2), "serial": m.group(3) or ""})
+        elif listing and devices:
+            break
+    return devices
+
+
+class DevicePool:
+    """
+    Leases dongles to captures, one capture per dongle. Devices are keyed by
+    serial number when serials are unique (so per-device settings survive
+    re-plugging), otherwise by index; captures pass the index to `-d`.
+    """
+
+    def __init__(self, settings=None):
+        self.settings = settings or config_store.settings
+        self._lock = threading.Lock()
+        self._devices = []
+        self._leases = {}
+
+    @staticmethod
+    def _keyed(devices):
+        serials = [d["serial"] for d in devices]
+        unique = all(serials) and len(set(serials)) == len(serials)
+        return [{**d, "key": d["serial"] if unique else f"#{d['index']}"} for d in devices]
+
+    @staticmethod
+    def _same_dongle(old, devices):
+        """The device in `devices` that `old` was: by serial when that is unique, else by index."""
+        if old["serial"]:
+            matches = [d for d in devices if d["serial"] == old["serial"]]
+            if len(matches) == 1:
+                return matches[0]
+        return next((d for d in devices if d["index"] == old["index"]), None)
+
+    def refresh(self, devices=None):
+        """
+        Re-enumerate dongles. Leases on devices that are still present are
+        kept, and follow them if plugging a dongle in or out changes how
+        devices are keyed (serial vs index).
+        """
+        devices = self._keyed(list_devices() if devices is None else devices)
+        with self._lock:
+            old = {d["key"]: d for d in self._devices}
+            leases = {}
+            for key, owner in self._leases.items():
+                device = self._same_dongle(old[key], devices) if key in old else None
+                if device is not None and device["key"] not in leases:
+                    leases[device["key"]] = owner
+            self._devices, self._leases = devices, leases
+            return len(devices)
+
+    def devices(self):
+        with self._lock:
+            return [{**d, "leased_by": self._leases.get(d["key"])} for d in self._devices]
+
+    def lease(self, owner):
+        """Reserve a free dongle for `owner`; returns the device dict or None."""
+        with self._lock:
+            for d in self._devices:
+                if d["key"] not in self._leases:
+                    self._leases[d["key"]] = owner
+                    return dict(d)
+        return None
+
+    def release(self, device):
+        with self._lock:
+            if self._leases.pop(device["key"], None) is None:
+                # Leased before a refresh re-keyed the devices
+                current = self._same_dongle(device, self._devices)
+                if current is not None:
+                    self._leases.pop(current["key"], None)
+
+    def ppm(self, device):
+        """settings.json `device_ppm` for this dongle (by key), else the global `rtl_ppm`."""
+        settings = self.settings.get()
+        per_device = settings.get("device_ppm") or {}
+        try:
+            return int(per_device.get(device["key"], settings.get("rtl_ppm", 0)))
+        except (TypeError, ValueError):
+            return 0
+
+
 if __name__ == "__main__":
     # Simple CLI test
     if rtl_sdr_present():
         print("✅ RTL-SDR detected and ready.")
     else:
         print("❌ No RTL-SDR detected.")
+    for d in list_devices():
+        print(f"  #{d['index']}: {d['name']} (SN {d['serial'] or '—'})")
         
@@ -1,16 +1,38 @@
-import csv, datetime, time, subprocess, json, sys, threading, select, psutil, schedule, logging, re, os
+import datetime, time, json, sys, threading, select, signal, logging, re, os, math
 from pathlib import Path
 from zoneinfo import ZoneInfo
 from logging.handlers import RotatingFileHandler
-from app.utils import sdr, tle as tle_utils, passes as passes_utils
+from app.utils import sdr, tle as tle_utils, passes as passes_utils, pass_store, scheduler_control
+from app.utils.config_store import settings, user_config
 from app.utils.iq_cleanup import periodic_cleanup
-from app import config_paths
+from app.utils.timer_queue import TimerQueue
+from app.utils.capture_supervisor import Capture, CaptureSupervisor
+from app.utils.capture_writer import RawWriter, WavWriter
+from app.utils import iq_demod
+from app.utils.vis_detector import VisDetector
+from app.utils.waterfall import Waterfall
+from app.utils.decoder import IMAGES_DIR, decode_sstv_segment
+from app.utils.pass_selection import select_passes
+from app.utils.elevation_gate import gate_passes
 
 # --- CONFIG ---
-SAT_FREQ = {"ISS": 145.800e6}
-RECORDINGS_DIR, LOG_DIR, SETTINGS_FILE = Path("recordings"), Path("logs"), Path("settings.json")
-PASS_FILE, SAMPLE_RATE, GAIN = "predicted_passes.csv", 48000, 29.7
-ELEVATION_THRESHOLD, START_EARLY, STOP_LATE = 0, 30, 30
+SAT_FREQ = tle_utils.DOWNLINK_HZ
+RECORDINGS_DIR, LOG_DIR = Path("recordings"), Path("logs")
+SAMPLE_RATE, GAIN = 48000, 29.7
+# Captures start on the second (timer_queue), so only tuner start-up needs padding
+START_EARLY, STOP_LATE = 5, 5
+# Record only while the satellite is above ELEVATION_THRESHOLD (and the
+# horizon mask); skip passes peaking below MIN_PEAK_ELEVATION. settings.json
+# "elevation_gate" overrides both, per satellite too (see elevation_gate.py)
+ELEVATION_THRESHOLD, MIN_PEAK_ELEVATION = 10, 0
+# Hot standby: rtl_fm is opened, tuned and settling this long before the
+# recording starts (settings.json "preroll_s"); the last PREROLL_RING_S of
+# the discarded stream lead into the WAV
+PREROLL_S, PREROLL_RING_S = 20, 0.5
+# settings.json "capture_mode": "audio" records rtl_fm audio; "iq" keeps the
+# rtl_sdr IQ (for re-demodulation later) and demodulates it after LOS
+CAPTURE_MODES = ("audio", "iq")
+REFRESH_INTERVAL_S = 3600
 GREEN, RED, RESET = "\033[92m", "\033[91m", "\033[0m"
 RECORDINGS_DIR.mkdir(exist_ok=True); LOG_DIR.mkdir(exist_ok=True)
 
@@ -23,6 +45,14 @@ if not logger.handlers:
 
 STATE_FILE = os.path.expanduser("~/sstv-groundstation/current_pass.json")
 
+STARTED = datetime.datetime.now(datetime.timezone.utc)
+
+timers = TimerQueue()
+# (satellite, AOS unix seconds) of passes whose capture timer has fired
+started_passes = set()
+captures = CaptureSupervisor()
+devices = sdr.DevicePool(settings)
+
 def mark_pass_start(sat, iq_file, los):
     data = {
         "satellite": sat,
@@ -36,24 +66,27 @@ def mark_pass_start(sat, iq_file, los):
     except Exception as e:
         logger.warning(f"Could not write pass state: {e}")
 
-def mark_pass_end():
+def read_pass_state():
+    try:
+        with open(STATE_FILE) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def mark_pass_end(iq_file=None):
+    """Clear the pass state; with `iq_file`, only if it still describes that capture."""
     try:
+        if iq_file is not None and os.path.exists(STATE_FILE):
+            with open(STATE_FILE) as f:
+                if json.load(f).get("iq_file") != str(iq_file):
+                    return  # a concurrent capture on another dongle owns it now
         if os.path.exists(STATE_FILE):
             os.remove(STATE_FILE)
     except Exception as e:
         logger.warning(f"Could not remove pass state: {e}")
 
 def load_config_data():
-    f = Path(config_paths.CONFIG_FILE)
-    try:
-        if f.exists():
-            with open(f) as file:
-                return json.load(file)
-        else:
-            return {}
-    except Exception as e:
-        logger.warning(f"Could not load config data: {e}")
-        return {}
+    return user_config.get()
 
 def log_and_print(level, msg, plog=None):
     print(msg if "Next job" not in msg else f"\r{msg}", end="", flush=True)
@@ -61,29 +94,56 @@ def log_and_print(level, msg, plog=None):
     if plog: getattr(plog, level)(msg)
 
 def recordings_enabled():
+    return bool(settings.get("recording_enabled", False))
+
+def preroll_s():
     try:
-        if SETTINGS_FILE.exists():
-            with open(SETTINGS_FILE) as f:
-                return json.load(f).get("recording_enabled", False)
-        return False
-    except Exception as e:
-        logger.warning(f"Could not check if recordings are enabled: {e}")
-        return False
+        return max(0.0, float(settings.get("preroll_s", PREROLL_S)))
+    except (TypeError, ValueError):
+        return PREROLL_S
+
+def capture_mode():
+    mode = settings.get("capture_mode", "audio")
+    return mode if mode in CAPTURE_MODES else "audio"
+
+def capture_lead_s():
+    """Seconds before AOS a capture takes its dongle: START_EARLY plus the pre-roll."""
+    return START_EARLY + preroll_s()
+
+def track_summary(track):
+    """Pass geometry for the metadata file, read from the precomputed track."""
+    if track is None or not len(track["el"]):
+        return None
+    peak = int(track["el"].argmax())
+    doppler = track["doppler_hz"]
+    return {
+        "max_elevation": round(float(track["el"][peak]), 1),
+        "peak_azimuth": round(float(track["az"][peak]), 1),
+        "aos_azimuth": round(float(track["az"][0]), 1),
+        "los_azimuth": round(float(track["az"][-1]), 1),
+        "min_range_km": round(float(track["range_km"].min()), 1),
+        "doppler_hz": None if math.isnan(doppler[0]) else
+            [round(float(doppler[0])), round(float(doppler[-1]))]
+    }
 
-def write_metadata(start_str, sat, aos, los, freq_hz, dur, size, verdict, error, base_name):
+def write_metadata(start_str, sat, aos, los, freq_hz, dur, size, verdict, error, base_name, track=None,
+                   window=None, iq=None, sstv_events=()):
     meta = {
         "satellite": sat,
         "timestamp": aos.isoformat(),
         "aos": aos.isoformat(),
         "los": los.isoformat(),
+        "recording_window": [window[0].isoformat(), window[1].isoformat()] if window else None,
         "frequency": round(freq_hz/1e6, 3),
         "mode": "FM",
         "duration_s": dur,
         "file_mb": round(size, 2),
         "verdict": verdict,
-        "sstv_detected": False,
+        "sstv_detected": bool(sstv_events),
+        "sstv_events": list(sstv_events),
         "callsigns": [],
         "error": error or None,
+        "pass": track_summary(track),
         "files": {
             "wav": f"{base_name}.wav",
             "png": f"{base_name}.png",
@@ -91,191 +151,425 @@ def write_metadata(start_str, sat, aos, los, freq_hz, dur, size, verdict, error,
             "json": f"{base_name}.json"
         }
     }
+    if iq and (RECORDINGS_DIR / f"{base_name}.iq").exists():
+        meta["files"]["iq"] = f"{base_name}.iq"
+        meta["iq"] = iq  # lets iq_demod re-demodulate the pass later
     (RECORDINGS_DIR / f"{base_name}.json").write_text(json.dumps(meta, indent=2))
 
-def record_pass(sat, aos, los):
+def close_pass_log(plog):
+    for h in list(plog.handlers):
+        plog.removeHandler(h)
+        h.close()
+
+def skip_pass(msg, plog):
+    log_and_print("warning", msg, plog)
+    close_pass_log(plog)
+
+def record_pass(sat, aos, los, pass_id=None, window=None):
+    """
+    Capture every configured downlink of a pass, each on its own leased
+    dongle, during `window` (start, end) — the elevation-gated part of AOS–LOS.
+    """
+    started_passes.add((sat, aos.timestamp()))
+    freqs = tle_utils.downlinks_hz(sat)
+    if not freqs:
+        return log_and_print("warning", f"[{sat}] No frequency configured — skipping.")
+    for freq in freqs:
+        record_downlink(sat, aos, los, freq, pass_id, window)
+
+def record_downlink(sat, aos, los, freq, pass_id=None, window=None):
     start_str = aos.strftime("%Y%m%d_%H%M")
     safe_sat = re.sub(r'[^A-Za-z0-9_-]', '_', sat)
-    freq = SAT_FREQ.get(sat.split()[0].replace(" ", "-"))
-    if not freq:
-        return log_and_print("warning", f"[{sat}] No frequency configured — skipping.")
     freq_mhz = f"{freq/1e6:.3f}MHz"
     base_name = f"{start_str}_{safe_sat}_{freq_mhz}"
     wav = RECORDINGS_DIR / f"{base_name}.wav"
+    iq = RECORDINGS_DIR / f"{base_name}.iq"
+    mode = capture_mode()
 
-    plog = logging.getLogger(start_str)
-    plog.setLevel(logging.INFO)
+    # Unregistered logger: one per capture, so overlapping passes never share handlers
+    plog = logging.Logger(base_name, logging.INFO)
     plog.addHandler(RotatingFileHandler(RECORDINGS_DIR/f"{base_name}.log",
                                         maxBytes=200_000, backupCount=1))
 
-    if not sdr.sdr_exists():
-        return log_and_print("warning", f"[{sat}] SDR not detected — skipping.", plog)
+    if not devices.devices():
+        devices.refresh()
+    device = devices.lease(base_name)
+    if device is None:
+        if devices.devices():
+            return skip_pass(f"[{sat}] All SDRs busy with other captures — skipping {freq_mhz}.", plog)
+        return skip_pass(f"[{sat}] SDR not detected — skipping.", plog)
 
     statvfs = os.statvfs(str(RECORDINGS_DIR))
     free_gb = (statvfs.f_frsize * statvfs.f_bavail) / (1024**3)
     if free_gb < 3:
-        return log_and_print("warning", f"[{sat}] Not enough disk space ({free_gb:.2f} GB free) — skipping.", plog)
+        devices.release(device)
+        return skip_pass(f"[{sat}] Not enough disk space ({free_gb:.2f} GB free) — skipping.", plog)
+
+    # Pre-roll until START_EARLY before the window opens, then record until
+    # it closes + STOP_LATE (from now if the capture started late)
+    rec_start, rec_end = window or (aos, los)
+    commit_at = (rec_start - datetime.timedelta(seconds=START_EARLY)).timestamp()
+    if commit_at <= time.time():
+        commit_at = None
+    dur = int(rec_end.timestamp() - (commit_at or time.time())) + STOP_LATE
+    if dur <= STOP_LATE:
+        devices.release(device)
+        return skip_pass(f"[{sat}] Pass already over — skipping.", plog)
+    if commit_at:
+        log_and_print("info",
+            f"[{sat}] ▶ Pre-roll on SDR #{device['index']} at {freq/1e6:.3f} MHz — "
+            f"WAV capture for {dur}s starts in {commit_at - time.time():.0f}s", plog)
+    else:
+        log_and_print("info",
+            f"[{sat}] ▶ WAV capture for {dur}s at {freq/1e6:.3f} MHz on SDR #{device['index']}", plog)
+    # The store may have been replaced (and renumbered) since this timer was set
+    track = pass_store.get_track(pass_id, sat, aos) if pass_id is not None else None
+    if (geom := track_summary(track)):
+        log_and_print("info",
+            f"[{sat}] Max elevation {geom['max_elevation']}° at az {geom['peak_azimuth']}°, "
+            f"Doppler {geom['doppler_hz']} Hz", plog)
 
-    dur = int((los - aos).total_seconds()) + STOP_LATE
-    log_and_print("info", f"[{sat}] ▶ WAV capture for {dur}s at {freq/1e6:.3f} MHz", plog)
+    ppm = devices.ppm(device)
 
-    ppm = 0
-    try:
-        if SETTINGS_FILE.exists():
-            ppm = json.loads(SETTINGS_FILE.read_text()).get("rtl_ppm", 0)
-    except Exception as e:
-        logger.warning(f"Could not load ppm: {e}")
+    mark_pass_start(sat, iq if mode == "iq" else wav, rec_end)
 
-    mark_pass_start(sat, wav, los)
+    decodes = []  # SSTV decode threads; metadata and the pass log wait for them
 
-    error = None; size = 0.0
-    try:
-        cmd = (
-            f"timeout {dur} rtl_fm -f {int(freq)} -M fm -s {SAMPLE_RATE} "
-            f"-g {GAIN} -l 0 -p {ppm} "
-            f"| sox -t raw -r {SAMPLE_RATE} -e signed -b 16 -c 1 - "
-            f" -c 1 {wav}"
-        )
-        subprocess.run(cmd, shell=True, check=True)
-        subprocess.run([
-            "sox", str(wav), "-n", "spectrogram",
-            "-o", str(RECORDINGS_DIR / f"{base_name}.png")
-        ], check=True)
+    def finished(cap):
         size = wav.stat().st_size / (1024*1024) if wav.exists() else 0.0
-    except Exception as e:
-        error = str(e)
-
-    verdict = "PASS" if not error and size > 0 else "FAIL"
-    print(f"{GREEN if verdict=='PASS' else RED}[{sat}] PASS COMPLETE — {verdict} — {size:.2f} MB{RESET}")
-    write_metadata(start_str, sat, aos, los, freq, dur, size, verdict, error, base_name)
+        verdict = "PASS" if not cap.error and size > 0 else "FAIL"
+        if cap.stop_reason not in (None, "deadline"):
+            plog.warning(f"Capture stopped early: {cap.stop_reason}")
+        print(f"{GREEN if verdict=='PASS' else RED}[{sat}] PASS COMPLETE — {verdict} — {size:.2f} MB{RESET}")
+        devices.release(device)
+        # Off the supervisor's loop: the last image may still be decoding
+        threading.Thread(target=finalize, args=(cap, size, verdict)).start()
+
+    def finalize(cap, size, verdict):
+        try:
+            for t in decodes:
+                t.join()
+            write_metadata(start_str, sat, aos, los, freq, dur, size, verdict, cap.error, base_name, track,
+                           window, iq_info, cap.events)
+            mark_pass_end(iq if mode == "iq" else wav)
+        except Exception as e:
+            plog.warning(f"Writing pass metadata failed: {e}")
+        finally:
+            close_pass_log(plog)
+
+    def sstv_started(event):
+        image = IMAGES_DIR / f"{base_name}_sstv_{len(capture.events) + 1}.png"
+        capture.events.append(event)
+        log_and_print("info", f"[{sat}] 📷 SSTV image started (mode {event['mode']}) at {event['t']:.1f}s", plog)
+        decode = threading.Thread(target=decode_when_recorded, args=(event, image), daemon=True)
+        decodes.append(decode)
+        decode.start()
+
+    def decode_when_recorded(event, image):
+        # Decode as soon as the whole image (plus a second) is in the WAV, not at LOS
+        end = event["offset"] + int((event["duration_s"] + 1) * detector.sample_rate)
+        while detector.samples < end and capture.finished is None:
+            time.sleep(1)
+        try:
+            decoded = decode_sstv_segment(wav, event["header_offset"], end - event["header_offset"], image)
+        except Exception as e:
+            decoded = None
+            plog.warning(f"SSTV decode of {image.name} failed: {e}")
+        if decoded and Path(decoded).exists():
+            event["image"] = Path(decoded).name
+        log_and_print("info", f"[{sat}] 📷 {event['mode']} image at {event['t']:.1f}s "
+                              f"{'decoded: ' + event['image'] if 'image' in event else 'could not be decoded'}", plog)
+
+    # Both listen to the live audio, or to the IQ demodulator's output
+    detector = VisDetector(SAMPLE_RATE, on_event=sstv_started)
+    waterfall = Waterfall(SAMPLE_RATE)
+
+    def render_waterfall(cap):
+        tiles = IMAGES_DIR / "waterfall" / base_name if settings.get("waterfall_tiles") else None
+        waterfall.save(RECORDINGS_DIR / f"{base_name}.png", tiles)
+    if mode == "iq":
+        # Tuned off the downlink to keep the DC spike out; iq_demod shifts it back
+        center = int(freq) + iq_demod.TUNE_OFFSET_HZ
+        iq_info = iq_demod.iq_info(iq_demod.IQ_RATE, center, int(freq),
+                                   doppler=iq_demod.doppler_curve(track, int(freq)))
+        source = ["rtl_sdr", "-d", str(device["index"]), "-f", str(center), "-s", str(iq_demod.IQ_RATE),
+                  "-g", str(GAIN), "-p", str(ppm), "-"]
+        writer, rate, taps = RawWriter(iq, frame_bytes=2), iq_demod.IQ_RATE, []
+
+        def demodulate(cap):
+            # Doppler tracking needs the time of the first sample, known only now
+            iq_info["start"] = cap.first_sample_time(rate)
+            demod = iq_demod.demodulator_for(iq_info)
+            plog.info(f"Demodulating IQ ({type(demod).__name__}, {demod.bandwidth_hz / 1e3:g} kHz channel)")
+            iq_demod.demodulate_file(iq, wav, demod, taps=[detector, waterfall])
+
+        post = [demodulate, render_waterfall]
+    else:
+        source = ["rtl_fm", "-d", str(device["index"]), "-f", str(int(freq)), "-M", "fm", "-s", str(SAMPLE_RATE),
+                  "-g", str(GAIN), "-l", "0", "-p", str(ppm)]
+        writer, rate = WavWriter(wav, SAMPLE_RATE), SAMPLE_RATE
+        post, iq_info, taps = [render_waterfall], None, [detector, waterfall]
+
+    capture = Capture(
+        base_name,
+        source,
+        writer,
+        deadline=rec_end.timestamp() + STOP_LATE,
+        log=plog,
+        post=post,
+        on_done=finished,
+        commit_at=commit_at,
+        ring_bytes=int(PREROLL_RING_S * rate) * writer.frame_bytes,
+        taps=taps
+    )
+    # Runs on the supervisor's event loop; the timer thread returns immediately
+    captures.submit(capture)
 
 def schedule_passes(passes):
+    """
+    Replace the pending capture timers with one per selected upcoming pass,
+    capture_lead_s() before its recording window so the SDR is streaming by
+    the time recording starts. Windows are cut to the part of the pass
+    above the elevation gate, then overlapping passes are resolved by
+    pass_selection; dropped ones are logged with the reason. Passes of
+    satellites without a downlink are never candidates and only counted.
+    """
     cfg = load_config_data()
     user_tz = cfg.get("timezone", "UTC")
     tzinfo = ZoneInfo(user_tz)
-    for sat, aos, los, _ in passes:
-        aos_local = aos.astimezone(tzinfo)
-        start = (aos_local - datetime.timedelta(seconds=START_EARLY))
-        schedule.every().day.at(start.strftime("%H:%M")).do(record_pass, sat, aos, los)
+    now = datetime.datetime.now(tzinfo)
+    timers.cancel_tag("pass")
+    lead = datetime.timedelta(seconds=capture_lead_s())
+    candidates = [{"satellite": sat, "start": aos, "end": los, "max_elevation": max_el, "id": pass_id}
+                  for sat, aos, los, max_el, pass_id in passes if los > now]
+    recordable = [p for p in candidates if tle_utils.downlink_hz(p["satellite"])]
+    if len(recordable) < len(candidates):
+        logger.debug(f"{len(candidates) - len(recordable)} upcoming passes have no downlink configured.")
+    gated, below = gate_passes(recordable, min_elevation=ELEVATION_THRESHOLD, min_peak=MIN_PEAK_ELEVATION)
+    # Passes whose timer already fired are left alone; one that fell due while
+    # this refresh ran is scheduled again (now) rather than dropped
+    started_passes.difference_update({k for k in started_passes if k[1] < now.timestamp() - 86400})
+    upcoming = [p for p in gated if (p["satellite"], p["aos"].timestamp()) not in started_passes]
+    selected, dropped = select_passes(upcoming, pad_before=lead.total_seconds(), pad_after=STOP_LATE,
+                                      devices=max(1, len(devices.devices())))
+    dropped = sorted(below + dropped, key=lambda d: d["pass"]["start"])
+    for d in dropped:
+        p = d["pass"]
+        log_and_print("info",
+            f"⏭ Not recording {p['satellite']} at {p['start'].astimezone(tzinfo):%Y-%m-%d %H:%M:%S} "
+            f"{user_tz}: {d['reason']}."
+        )
+    for p in selected:
+        start = p["start"].astimezone(tzinfo) - lead
+        timers.call_at(start, record_pass, p["satellite"], p["aos"], p["los"], p["id"],
+                       (p["start"], p["end"]), tag="pass")
         log_and_print("info",
-            f"📅 Scheduled {sat} at {start:%Y-%m-%d %H:%M:%S} {user_tz} for {(los - aos).seconds}s."
+            f"📅 Scheduled {p['satellite']} at {start:%Y-%m-%d %H:%M:%S} {user_tz} "
+            f"for {(p['end'] - p['start']).seconds}s of {(p['los'] - p['aos']).seconds}s (score {p['score']})."
         )
 
-def load_pass_predictions(path):
-    """Read predicted_passes.csv and return list of (sat, aos, los, max_el)."""
-    results = []
-    try:
-        with open(path, newline="") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    sat = row["satellite"]
-                    aos = datetime.datetime.fromisoformat(row["aos"]).replace(tzinfo=ZoneInfo("UTC"))
-                    los = datetime.datetime.fromisoformat(row["los"]).replace(tzinfo=ZoneInfo("UTC"))
-                    max_el = float(row.get("max_elev", 0))
-                    results.append((sat, aos, los, max_el))
-                except Exception as e:
-                    logger.warning(f"Skipping bad row in {path}: {e}")
-    except FileNotFoundError:
-        logger.warning(f"No pass file found at {path}")
-    return results
-
-def refresh_predictions():
-    """Update TLEs, regenerate 48h of passes, and reschedule jobs."""
+def load_pass_predictions():
+    """Read the pass store and return list of (sat, aos, los, max_el, pass_id) ordered by AOS."""
+    passes = pass_store.all_passes()
+    if not passes:
+        logger.warning(f"No passes found in {pass_store.PASS_DB}")
+    return [(p["satellite"], p["start"], p["end"], p["max_elevation"], p["id"]) for p in passes]
+
+def refresh_predictions(fetch_tle=True):
+    """Update TLEs (unless fetch_tle is False), regenerate 48h of passes, and reschedule jobs."""
     cfg = load_config_data()
     if not cfg.get("latitude") or not cfg.get("longitude"):
         return log_and_print("warning", "No location set — skipping prediction refresh.")
 
-    # Update TLEs (ISS shown as example; include others as needed)
-    tle_data = []
-    for s in tle_utils.TLE_SOURCES:
-        if "ISS" in s.upper():
-            tle = tle_utils.fetch_tle(s)
-            if tle:
-                tle_data.append(tle)
-                log_and_print("info", f"✅ Updated TLE for {s}")
-            else:
-                log_and_print("warning", f"⚠ No TLE found for {s}")
-    tle_utils.save_tle(tle_data)
-
-    # Regenerate and overwrite CSV for next 48h from now
+    # Update TLEs with one conditional bulk request; an unchanged catalog
+    # keeps the prediction cache valid, so only the window tail is predicted
+    tle_changed = tle_utils.refresh_tle_file() if fetch_tle else None
+    if tle_changed:
+        log_and_print("info", "✅ Updated TLEs")
+    elif tle_changed is False:
+        log_and_print("info", "TLEs unchanged — rolling prediction window forward only.")
+    elif fetch_tle:
+        log_and_print("warning", "⚠ TLE refresh failed — keeping existing TLEs.")
+
+    # Re-enumerate dongles (leases held by running captures are kept)
+    devices.refresh()
+
+    # Roll the 48h prediction window forward in the pass store
     passes_utils.generate_predictions(
         cfg["latitude"], cfg["longitude"], cfg.get("altitude", 0),
-        cfg.get("timezone", "UTC"), "app/static/tle/active.txt", hours=48
+        cfg.get("timezone", "UTC"), "app/static/tle/active.txt", hours=48,
+        workers=passes_utils.prediction_workers()
     )
 
-    # Reload CSV and reschedule jobs
-    new_passes = load_pass_predictions(PASS_FILE)
-    schedule.clear()  # clear all jobs
+    # Reload passes and reschedule captures (the refresh timer is left alone)
+    new_passes = load_pass_predictions()
+    timers.cancel_tag("pass")
     if new_passes:
         log_and_print("info", f"📅 Predictions refreshed — {len(new_passes)} passes found.")
         schedule_passes(new_passes)
     else:
         log_and_print("warning", "No passes after refresh — will retry hourly.")
+    return tle_changed
+
+def periodic_refresh():
+    """Refresh now and re-arm the next hourly refresh."""
+    try:
+        refresh_predictions()
+    finally:
+        timers.cancel_tag("refresh")
+        timers.call_later(REFRESH_INTERVAL_S, periodic_refresh, tag="refresh")
+
+def set_recordings_enabled(enabled):
+    try:
+        settings.update(recording_enabled=enabled)
+    except Exception as e:
+        logger.warning(f"Could not update settings file: {e}")
+
+def location_changed(new, old):
+    """Re-predict (without a TLE download) when the observer location or timezone is edited."""
+    keys = ("latitude", "longitude", "altitude", "altitude_m", "timezone")
+    if any(new.get(k) != old.get(k) for k in keys):
+        log_and_print("info", "Location settings changed — refreshing predictions.")
+        timers.call_soon(refresh_predictions, False, tag="manual")
+
+def recording_setting_changed(new, old):
+    """Stop when recording_enabled is switched off in settings.json other than through the control socket."""
+    if old.get("recording_enabled") and not new.get("recording_enabled") and not timers.stopped:
+        stop_scheduler("Recordings disabled in settings")
+
+def stop_scheduler(reason):
+    """Stop running captures (they finalize their WAVs) and end the timer loop."""
+    log_and_print("info", f"{reason} — stopping scheduler.")
+    captures.stop(reason=reason.lower())
+    timers.stop()
+
+def next_pass():
+    pending = timers.pending("pass")
+    if not pending:
+        return None
+    sat, aos, los, _, (rec_start, rec_end) = pending[0].args
+    return {"satellite": sat, "start": aos.isoformat(), "end": los.isoformat(),
+            "recording_window": [rec_start.isoformat(), rec_end.isoformat()],
+            "capture_at": datetime.datetime.fromtimestamp(pending[0].when, datetime.timezone.utc).isoformat()}
+
+def control_status(request):
+    return {
+        "pid": os.getpid(),
+        "recording_enabled": not timers.stopped,
+        "started": STARTED.isoformat(),
+        "captures": captures.active(),
+        "devices": devices.devices(),
+        "next_pass": next_pass(),
+        "scheduled": len(timers.pending("pass"))
+    }
+
+def control_current_pass(request):
+    return {"current_pass": read_pass_state(), "captures": captures.active()}
+
+def control_enable(request):
+    # A running scheduler is enabled; just make sure settings.json agrees
+    set_recordings_enabled(True)
+    return {"recording_enabled": True}
+
+def control_disable(request):
+    # Stop first so the settings subscriber sees a stopped scheduler
+    stop_scheduler("Recordings disabled")
+    set_recordings_enabled(False)
+    return {"recording_enabled": False}
+
+def control_refresh(request):
+    """Queue a refresh on the timer thread; `fetch_tle: false` only re-reads predictions."""
+    timers.call_soon(refresh_predictions, bool(request.get("fetch_tle", True)), tag="manual")
+    return {"queued": True}
+
+CONTROL_COMMANDS = {
+    "status": control_status,
+    "current_pass": control_current_pass,
+    "enable": control_enable,
+    "disable": control_disable,
+    "refresh": control_refresh
+}
+
+def show_next_job(timer):
+    """Status line printed whenever the timer loop goes back to sleep."""
+    if timer is None or timer.tag != "pass":
+        return
+    cfg = load_config_data()
+    user_tz = cfg.get("timezone", "UTC")
+    nj_local = datetime.datetime.fromtimestamp(timer.when, ZoneInfo(user_tz))
+    delta = timer.when - time.time()
+    log_and_print("info",
+        f"⏳ Next job in {int(delta)}s at {nj_local.strftime('%H:%M:%S')} {user_tz}"
+    )
+
+def handle_signal(signum, frame):
+    """SIGTERM/SIGINT stop the timer loop; SIGHUP queues an immediate refresh."""
+    if signum == signal.SIGHUP:
+        timers.call_soon(refresh_predictions, tag="manual")
+    else:
+        timers.stop()
 
 def listen_for_keypress():
     try:
-        while True:
+        while not timers.stopped:
             if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
                 if sys.stdin.read(1).lower() == "x":
-                    try:
-                        SETTINGS_FILE.write_text(json.dumps({"recording_enabled": False}))
-                    except Exception as e:
-                        logger.warning(f"Could not update settings file: {e}")
-                    sys.exit(0)
+                    timers.stop()
+                    set_recordings_enabled(False)
+                    return
             time.sleep(0.1)
     except Exception as e:
         logger.warning(f"Error in keypress listener: {e}")
         return
 
-# Allow manual refresh from Flask by importing this function
-def manual_refresh():
-    """Public entry point for Flask route to trigger a refresh."""
-    refresh_predictions()
-    return {"ok": True}
-
 if __name__ == "__main__":
     threading.Thread(target=periodic_cleanup, kwargs={"interval_minutes":30}, daemon=True).start()
     logger.info("Scheduler starting up — running prechecks...")
     if not recordings_enabled():
         sys.exit(0)
-    if not sdr.sdr_exists():
-        SETTINGS_FILE.write_text(json.dumps({"recording_enabled": False}))
+    if not scheduler_control.acquire_pid_lock():
+        logger.info(f"Scheduler already running (PID {scheduler_control.scheduler_pid()}) — exiting.")
+        sys.exit(0)
+    if not devices.refresh():
+        set_recordings_enabled(False)
         sys.exit(1)
+    logger.info(f"{len(devices.devices())} SDR(s): " +
+                ", ".join(f"#{d['index']} {d['serial'] or d['name']}" for d in devices.devices()))
+
+    # The web app sends status/enable/disable/refresh here instead of scanning
+    # processes and editing settings.json; serve it before the slow first refresh
+    control = scheduler_control.serve(CONTROL_COMMANDS)
 
-    # Initial refresh and hourly rolling refresh
+    # Initial refresh; periodic_refresh re-arms itself hourly
     refresh_predictions()
-    schedule.every(1).hours.do(refresh_predictions)
+    timers.call_later(REFRESH_INTERVAL_S, periodic_refresh, tag="refresh")
 
     # Load passes defensively; if empty, try one more refresh
-    passes = load_pass_predictions(PASS_FILE)
+    passes = load_pass_predictions()
     if not passes:
         log_and_print("warning", "No passes found — forcing secondary refresh.")
         refresh_predictions()
-        passes = load_pass_predictions(PASS_FILE)
+        passes = load_pass_predictions()
 
     if not passes:
         log_and_print("warning", "Still no passes — exiting. Next hourly refresh may recover.")
+        scheduler_control.close(control)
         sys.exit(0)
 
     log_and_print("info", f"{len(passes)} passes found — scheduling...")
     schedule_passes(passes)
 
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, handle_signal)
     threading.Thread(target=listen_for_keypress, daemon=True).start()
+    user_config.subscribe(location_changed)
+    user_config.watch()
+    settings.subscribe(recording_setting_changed)
+    settings.watch()
 
-    while True:
-        if not recordings_enabled():
-            break
-        schedule.run_pending()
-        if (nj := schedule.next_run()):
-            cfg = load_config_data()
-            user_tz = cfg.get("timezone", "UTC")
-            tzinfo = ZoneInfo(user_tz)
-            now_local = datetime.datetime.now(tzinfo)
-            nj_local = nj.replace(tzinfo=tzinfo)
-            delta = (nj_local - now_local)
-            log_and_print("info",
-                f"⏳ Next job in {int(delta.total_seconds())}s at {nj_local.strftime('%H:%M:%S')} {user_tz}"
-            )
-        time.sleep(5)
-        
+    try:
+        timers.run(on_idle=show_next_job)
+    finally:
+        # Let an in-progress capture finalize its WAV before exiting
+        captures.shutdown()
+        scheduler_control.close(control)
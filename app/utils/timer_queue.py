@@ -0,0 +1,137 @@
+"""
+timer_queue.py — heap-based timer core for the SDR scheduler.
+
+Timers are kept in a heap ordered by absolute deadline (unix seconds). The
+run loop sleeps on a condition variable until the earliest deadline, so
+jobs start within a few milliseconds of their due time instead of on the
+next polling tick. Any thread (or a signal handler) can add or cancel a
+timer, ask for a callback as soon as possible, or stop the loop; each of
+these wakes the sleeper immediately.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime
+
+# Upper bound on one sleep, so a wall-clock step (NTP sync after boot)
+# is noticed within a minute rather than at the old deadline.
+MAX_SLEEP_S = 60.0
+
+
+class Timer:
+    """Handle for a scheduled call; pass to TimerQueue.cancel()."""
+
+    __slots__ = ("when", "seq", "fn", "args", "tag", "cancelled")
+
+    def __init__(self, when, seq, fn, args, tag):
+        self.when = when
+        self.seq = seq
+        self.fn = fn
+        self.args = args
+        self.tag = tag
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class TimerQueue:
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def call_at(self, when, fn, *args, tag=None):
+        """Run `fn(*args)` at `when` (unix seconds or an aware datetime)."""
+        if isinstance(when, datetime):
+            when = when.timestamp()
+        timer = Timer(float(when), next(self._seq), fn, args, tag)
+        with self._cond:
+            heapq.heappush(self._heap, timer)
+            self._cond.notify()
+        return timer
+
+    def call_later(self, delay, fn, *args, tag=None):
+        return self.call_at(self._clock() + delay, fn, *args, tag=tag)
+
+    def call_soon(self, fn, *args, tag=None):
+        """Run `fn(*args)` on the loop thread as soon as it is free."""
+        return self.call_at(self._clock(), fn, *args, tag=tag)
+
+    def cancel(self, timer):
+        with self._cond:
+            timer.cancelled = True
+            self._cond.notify()
+
+    def cancel_tag(self, tag):
+        """Cancel every pending timer with `tag`; returns how many were cancelled."""
+        with self._cond:
+            count = 0
+            for timer in self._heap:
+                if timer.tag == tag and not timer.cancelled:
+                    timer.cancelled = True
+                    count += 1
+            self._heap = [t for t in self._heap if not t.cancelled]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+            return count
+
+    def pending(self, tag=None):
+        """Pending timers (optionally only those with `tag`), earliest first."""
+        with self._cond:
+            return sorted(t for t in self._heap if not t.cancelled and (tag is None or t.tag == tag))
+
+    def next_timer(self):
+        with self._cond:
+            self._drop_cancelled()
+            return self._heap[0] if self._heap else None
+
+    def stop(self):
+        """Make run() return after the callback in progress, if any."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    @property
+    def stopped(self):
+        return self._stopped
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    def run(self, on_idle=None):
+        """
+        Run due timers until stop() is called. `on_idle(next_timer)` is
+        called each time the loop is about to sleep.
+        """
+        while True:
+            with self._cond:
+                self._drop_cancelled()
+                due = None
+                if not self._stopped and self._heap and self._heap[0].when <= self._clock():
+                    due = heapq.heappop(self._heap)
+            if self._stopped:
+                return
+            if due is not None:
+                try:
+                    due.fn(*due.args)
+                except Exception as e:
+                    print(f"⚠ Timer callback {getattr(due.fn, '__name__', due.fn)} failed: {e}")
+                continue
+
+            if on_idle:
+                on_idle(self.next_timer())
+            with self._cond:
+                self._drop_cancelled()
+                if self._stopped:
+                    return
+                timeout = MAX_SLEEP_S
+                if self._heap:
+                    timeout = min(timeout, max(0.0, self._heap[0].when - self._clock()))
+                if timeout > 0:
+                    self._cond.wait(timeout)
@@ -1,6 +1,9 @@
-
 import os
+import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app.utils.tle_store import parse_tle_text
 
 # Map satellite names to their NORAD catalog numbers
 TLE_SOURCES = {
@@ -9,8 +12,46 @@ TLE_SOURCES = {
     # Add more satellites here if you want to track them
 }
 
+# Downlink frequencies (Hz), keyed by the first word of the satellite name.
+# A list records several downlinks of one pass at once (one dongle each);
+# the first is the primary, used for Doppler.
+DOWNLINK_HZ = {
+    "ISS": 145.800e6,
+}
+
 TLE_DIR = os.path.join(os.path.dirname(__file__), "..", "static", "tle")
 
+# Override to point the fetcher at a local Celestrak stand-in
+CELESTRAK_GP_URL = os.environ.get("CELESTRAK_GP_URL", "https://celestrak.org/NORAD/elements/gp.php")
+# ETag/Last-Modified validators; runtime state, kept out of the served static tree
+FETCH_STATE_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "tle_fetch_state.json"))
+
+_session = None
+
+def get_session():
+    """Shared pooled HTTP session for Celestrak requests."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        retry = Retry(total=2, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=4, max_retries=retry)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+def downlinks_hz(sat_name):
+    """All configured downlinks for a satellite name (e.g. "ISS (ZARYA)"), primary first."""
+    words = sat_name.split()
+    freqs = DOWNLINK_HZ.get(words[0]) if words else None
+    if not freqs:
+        return []
+    return list(freqs) if isinstance(freqs, (list, tuple)) else [freqs]
+
+def downlink_hz(sat_name):
+    """Primary downlink for a satellite name, or None."""
+    freqs = downlinks_hz(sat_name)
+    return freqs[0] if freqs else None
+
 def fetch_tle(sat_name):
     """Fetch a TLE for the given satellite name from Celestrak GP API."""
     catnr = TLE_SOURCES.get(sat_name)
@@ -18,9 +59,9 @@ def fetch_tle(sat_name):
         print(f"⚠ No NORAD ID for {sat_name}")
         return None
 
-    url = f"https://celestrak.org/NORAD/elements/gp.php?CATNR={catnr}&FORMAT=TLE"
+    url = f"{CELESTRAK_GP_URL}?CATNR={catnr}&FORMAT=TLE"
     try:
-        res = requests.get(url, timeout=10)
+        res = get_session().get(url, timeout=10)
         res.raise_for_status()
         lines = res.text.strip().splitlines()
         if len(lines) >= 3:
@@ -32,15 +73,140 @@ def fetch_tle(sat_name):
         print(f"❌ Failed to fetch TLE for {sat_name}: {e}")
         return None
 
+def _load_fetch_state():
+    try:
+        with open(FETCH_STATE_FILE) as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def _save_fetch_state(state):
+    try:
+        with open(FETCH_STATE_FILE, "w") as f:
+            json.dump(state, f, indent=2)
+    except Exception as e:
+        print(f"⚠ Could not save TLE fetch state: {e}")
+
+def _conditional_get(session, url, state, have_previous=True):
+    """
+    GET `url` with If-None-Match / If-Modified-Since from `state`.
+    Returns the response text, or None on 304 Not Modified. Without
+    `have_previous` (the local copy lacks what this URL returns) the
+    cached validators are dropped and the GET is unconditional, so a 304
+    can never leave the TLEs missing.
+    """
+    if not have_previous:
+        state.pop(url, None)
+    cached = state.get(url, {})
+    headers = {}
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+    res = session.get(url, headers=headers, timeout=10)
+    if res.status_code == 304:
+        return None
+    res.raise_for_status()
+    state[url] = {
+        "etag": res.headers.get("ETag"),
+        "last_modified": res.headers.get("Last-Modified")
+    }
+    return res.text
+
+def fetch_all_tle(sources=None, session=None, base_url=None, previous=None):
+    """
+    Fetch TLEs for every satellite in `sources` (default TLE_SOURCES) through
+    one pooled session. A single multi-CATNR GP query is tried first; any IDs
+    it does not return are fetched individually. Requests are conditional,
+    so unchanged data comes back as 304.
+
+    `previous` maps NORAD ID -> TLE dict and fills in IDs that were not
+    modified. Returns (tle_list, modified) where `modified` is False when
+    every request was answered with 304.
+    """
+    sources = sources or TLE_SOURCES
+    session = session or get_session()
+    base_url = base_url or CELESTRAK_GP_URL
+    previous = previous or {}
+    state = _load_fetch_state()
+    wanted = {int(n) for n in sources.values()}
+    found, modified = {}, False
+
+    def collect(text):
+        for name, l1, l2 in parse_tle_text(text):
+            norad = int(l1[2:7])
+            if norad in wanted:
+                found[norad] = {"name": name, "line1": l1, "line2": l2}
+
+    catnrs = ",".join(str(n) for n in sorted(wanted))
+    bulk_url = f"{base_url}?CATNR={catnrs}&FORMAT=TLE"
+    try:
+        have_all = all(n in previous for n in wanted)
+        text = _conditional_get(session, bulk_url, state, have_all)
+        if text is None and have_all:
+            _save_fetch_state(state)
+            return [previous[n] for n in sorted(wanted)], False
+        if text is not None:
+            modified = True
+            collect(text)
+    except Exception as e:
+        state.pop(bulk_url, None)  # don't let a 304 vouch for data that was never parsed
+        print(f"⚠ Bulk TLE query failed, fetching individually: {e}")
+
+    for norad in sorted(wanted - set(found)):
+        url = f"{base_url}?CATNR={norad}&FORMAT=TLE"
+        try:
+            text = _conditional_get(session, url, state, norad in previous)
+            if text is not None:
+                collect(text)
+                modified = True
+        except Exception as e:
+            state.pop(url, None)
+            print(f"❌ Failed to fetch TLE for {norad}: {e}")
+            text = None
+        if text is None and norad in previous:
+            found[norad] = previous[norad]
+
+    _save_fetch_state(state)
+    return [found[n] for n in sorted(found)], modified
+
+def format_tle(tle_data):
+    return "".join(f"{tle['name']}\n{tle['line1']}\n{tle['line2']}\n" for tle in tle_data)
+
+def refresh_tle_file(sources=None, session=None, base_url=None):
+    """
+    Bulk-fetch TLE_SOURCES and rewrite active.txt only if the content changed.
+    Returns True if the file was updated, False if Celestrak had nothing new
+    (304 or identical content), or None if nothing could be fetched.
+    """
+    path = os.path.join(TLE_DIR, "active.txt")
+    try:
+        with open(path) as f:
+            current = f.read()
+    except FileNotFoundError:
+        current = ""
+    previous = {
+        int(l1[2:7]): {"name": name, "line1": l1, "line2": l2}
+        for name, l1, l2 in parse_tle_text(current)
+    }
+
+    tle_data, modified = fetch_all_tle(sources, session, base_url, previous)
+    if not tle_data:
+        print("⚠ No TLEs fetched")
+        return None
+    if not modified or format_tle(tle_data) == current:
+        print("✅ TLEs unchanged")
+        return False
+    save_tle(tle_data)
+    return True
+
 def save_tle(tle_data):
     """Save a list of TLE dicts to active.txt in the TLE_DIR."""
     os.makedirs(TLE_DIR, exist_ok=True)
     path = os.path.join(TLE_DIR, "active.txt")
     try:
         with open(path, "w") as f:
-            for tle in tle_data:
-                f.write(f"{tle['name']}\n{tle['line1']}\n{tle['line2']}\n")
+            f.write(format_tle(tle_data))
         print(f"✅ TLEs saved to {path}")
     except Exception as e:
         print(f"❌ Failed to save TLEs: {e}")
-        
@@ -0,0 +1,258 @@
+"""
+tle_store.py — compact, memory-mapped index over every TLE file in a directory.
+
+All `*.txt` files in the TLE directory are parsed once into a NumPy
+structured array sorted by (NORAD ID, epoch), with permutation columns for
+name and epoch order. The array is written to a single binary file
+(`.tle_index.bin`: magic, JSON header, raw records) via temp + rename, so the
+web process and the scheduler can both map it without re-parsing any text.
+The index is rebuilt only when a source file's mtime/size changes.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+TLE_DIR = os.path.join(os.path.dirname(__file__), "..", "static", "tle")
+INDEX_NAME = ".tle_index.bin"
+MAGIC = b"SSTVTLE1"
+HEADER_ALIGN = 64
+
+RECORD_DTYPE = np.dtype([
+    ("norad", "<i4"),
+    ("epoch", "<f8"),       # unix seconds (UTC)
+    ("source", "<i2"),      # index into header["sources"]
+    ("seq", "<i4"),         # position of the TLE within its source file
+    ("by_name", "<i4"),     # permutation: rows in normalized-name order
+    ("by_epoch", "<i4"),    # permutation: rows in epoch order
+    ("name", "S24"),
+    ("norm", "S24"),
+    ("line1", "S69"),
+    ("line2", "S69"),
+])
+
+
+def normalize_name(name):
+    """Canonical form used for name lookups: upper case, single spaces."""
+    return " ".join(name.upper().split())
+
+
+def tle_epoch(line1):
+    """Parse the YYDDD.DDDDDDDD epoch field of TLE line 1 into a UTC datetime."""
+    epoch_str = line1[18:32]
+    year = int(epoch_str[:2])
+    year += 2000 if year < 57 else 1900
+    day_of_year = float(epoch_str[2:])
+    return datetime(year, 1, 1, tzinfo=timezone.utc) + timedelta(days=day_of_year - 1)
+
+
+def parse_tle_text(text):
+    """
+    Yield (name, line1, line2) for every TLE in `text`. Pairs are matched by
+    their "1 "/"2 " prefixes and catalog number rather than by stepping
+    through the file in threes, so two-line entries, blank lines and stray
+    trailing lines do not shift the rest of the file.
+    """
+    lines = [line.rstrip() for line in text.splitlines()]
+    lines = [line for line in lines if line.strip()]
+    prev = None
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        nxt = lines[i + 1] if i + 1 < len(lines) else ""
+        if (line.startswith("1 ") and nxt.startswith("2 ")
+                and len(line) >= 69 and len(nxt) >= 69 and line[2:7] == nxt[2:7]):
+            name = prev.strip() if prev else line[2:7].strip()
+            if name.startswith("0 "):
+                name = name[2:]
+            yield name, line[:69], nxt[:69]
+            prev = None
+            i += 2
+            continue
+        prev = line
+        i += 1
+
+
+def _sources(tle_dir):
+    """Sorted [(filename, mtime_ns, size)] for every TLE text file."""
+    out = []
+    for name in sorted(os.listdir(tle_dir)):
+        if name.endswith(".txt"):
+            st = os.stat(os.path.join(tle_dir, name))
+            out.append((name, st.st_mtime_ns, st.st_size))
+    return out
+
+
+def build_records(tle_dir, sources):
+    """Parse every source file into a sorted RECORD_DTYPE array."""
+    rows = []
+    for src_idx, (fname, _, _) in enumerate(sources):
+        with open(os.path.join(tle_dir, fname), encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        for seq, (name, l1, l2) in enumerate(parse_tle_text(text)):
+            try:
+                norad = int(l1[2:7])
+                epoch = tle_epoch(l1).timestamp()
+            except ValueError:
+                continue
+            rows.append((norad, epoch, src_idx, seq, 0, 0,
+                         name.encode()[:24], normalize_name(name).encode()[:24],
+                         l1.encode(), l2.encode()))
+    records = np.array(rows, dtype=RECORD_DTYPE)
+    records.sort(order=["norad", "epoch"])
+    records["by_name"] = np.argsort(records["norm"], kind="stable")
+    records["by_epoch"] = np.argsort(records["epoch"], kind="stable")
+    return records
+
+
+def write_index(path, sources, records):
+    """Atomically write header + records to `path`."""
+    header = json.dumps({
+        "sources": [list(s) for s in sources],
+        "count": int(len(records)),
+        "dtype": RECORD_DTYPE.descr,
+    }).encode()
+    offset = -(-(len(MAGIC) + 4 + len(header)) // HEADER_ALIGN) * HEADER_ALIGN
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tle_index.")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(4, "little"))
+            f.write(header)
+            f.write(b"\0" * (offset - len(MAGIC) - 4 - len(header)))
+            f.write(records.tobytes())
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def open_index(path):
+    """Return (header, memory-mapped records) for an index file, or (None, None)."""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None, None
+            hlen = int.from_bytes(f.read(4), "little")
+            header = json.loads(f.read(hlen))
+        offset = -(-(len(MAGIC) + 4 + hlen) // HEADER_ALIGN) * HEADER_ALIGN
+        if header["count"] == 0:
+            return header, np.zeros(0, dtype=RECORD_DTYPE)
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode="r",
+                            offset=offset, shape=(header["count"],))
+        return header, records
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+
+class TleStore:
+    """Lookups over the memory-mapped TLE index of one directory."""
+
+    def __init__(self, tle_dir=TLE_DIR):
+        self.tle_dir = os.path.abspath(tle_dir)
+        self.path = os.path.join(self.tle_dir, INDEX_NAME)
+        self._header = None
+        self._records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        """Map the on-disk index, rebuilding it if any source file changed."""
+        with self._lock:
+            sources = _sources(self.tle_dir) if os.path.isdir(self.tle_dir) else []
+            wanted = [list(s) for s in sources]
+            if self._header is not None and self._header["sources"] == wanted:
+                return self._records
+            header, records = open_index(self.path)
+            if header is None or header["sources"] != wanted:
+                records = build_records(self.tle_dir, sources)
+                write_index(self.path, sources, records)
+                header, records = open_index(self.path)
+            self._header, self._records = header, records
+            return self._records
+
+    @property
+    def sources(self):
+        self._ensure()
+        return [s[0] for s in self._header["sources"]]
+
+    def records(self):
+        """All records, sorted by (norad, epoch)."""
+        return self._ensure()
+
+    def by_norad(self, norad):
+        """Newest record for a NORAD ID, or None."""
+        rec = self._ensure()
+        hi = np.searchsorted(rec["norad"], int(norad), side="right")
+        if hi and rec["norad"][hi - 1] == int(norad):
+            return rec[hi - 1]
+        return None
+
+    def by_name(self, name):
+        """Newest record whose normalized name matches exactly, or None."""
+        rec = self._ensure()
+        order = rec["by_name"]
+        key = normalize_name(name).encode()[:24]
+        i = bisect_left(range(len(rec)), key, key=lambda k: rec["norm"][order[k]])
+        best = None
+        while i < len(rec) and rec["norm"][order[i]] == key:
+            row = rec[order[i]]
+            if best is None or row["epoch"] > best["epoch"]:
+                best = row
+            i += 1
+        return best
+
+    def by_epoch(self, start=None, end=None):
+        """Records whose epoch lies in [start, end) (datetimes), oldest first."""
+        rec = self._ensure()
+        epochs = rec["epoch"][rec["by_epoch"]]
+        lo = 0 if start is None else np.searchsorted(epochs, start.timestamp(), side="left")
+        hi = len(rec) if end is None else np.searchsorted(epochs, end.timestamp(), side="left")
+        return rec[rec["by_epoch"][lo:hi]]
+
+    def for_source(self, filename):
+        """Records from one source file, in file order."""
+        rec = self._ensure()
+        try:
+            idx = self.sources.index(os.path.basename(filename))
+        except ValueError:
+            return rec[:0]
+        rows = rec[rec["source"] == idx]
+        return rows[np.argsort(rows["seq"], kind="stable")]
+
+    def epoch_ages_days(self, filename=None, now=None):
+        """Age in days of each TLE epoch (one source file, or the whole index)."""
+        rows = self.for_source(filename) if filename else self._ensure()
+        now = (now or datetime.now(timezone.utc)).timestamp()
+        return (now - rows["epoch"]) / 86400.0
+
+
+def record_dict(row):
+    """Plain-Python view of one index record."""
+    return {
+        "name": row["name"].decode(),
+        "norad": int(row["norad"]),
+        "epoch": datetime.fromtimestamp(float(row["epoch"]), tz=timezone.utc),
+        "line1": row["line1"].decode(),
+        "line2": row["line2"].decode(),
+    }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(tle_dir=TLE_DIR):
+    """Return the process-wide TleStore for a directory."""
+    key = os.path.abspath(tle_dir)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = TleStore(key)
+        return store
@@ -0,0 +1,191 @@
+"""
+vis_detector.py — live SSTV detection on the capture stream.
+
+VisDetector is a capture_writer tap for s16 mono audio. Each 10 ms bin
+of the stream is reduced to its power at the four VIS tones (Goertzel
+single-bin DFTs, evaluated for every bin of a chunk as one matrix
+product) and labelled with the tone that clearly dominates it, if any.
+A small state machine follows the labels through the VIS header:
+
+    1900 Hz leader 300 ms, 1200 Hz break 10 ms, 1900 Hz leader 300 ms,
+    1200 Hz start bit, 7 data bits (LSB first) and even parity at
+    1100 Hz = 1 / 1300 Hz = 0, 1200 Hz stop bit — 30 ms per bit
+
+The start-bit edge is refined to about a millisecond and each bit is
+measured at its centre from there, so bin alignment does not matter.
+Every header with a known mode is reported as an event dict:
+
+    {"mode", "vis", "t", "offset", "header_offset", "duration_s"}
+
+where "offset" is the sample index (into the recording) where the image
+starts, "header_offset" where its leader starts (what a decoder that
+reads the VIS itself should be given) and "t" the offset in seconds.
+"""
+
+import numpy as np
+
+TONES = (1100, 1200, 1300, 1900)
+BIN_S = 0.010
+BIT_S = 0.030
+LEADER_S = 0.300
+BREAK_S = 0.010
+LEADER_MIN_S = 0.200      # of 1900 Hz before a 1200 Hz edge is taken as a start bit
+TONE_SHARE = 0.1          # of a window's energy the dominant tone must hold...
+TONE_DOMINANCE = 3.0      # ...and its power over the next strongest tone
+HISTORY_S = 1.0           # audio kept for measuring the bits of a pending header
+
+# VIS code -> (mode, image duration in seconds)
+VIS_MODES = {
+    0: ("Robot 12", 12), 4: ("Robot 24", 24), 8: ("Robot 36", 36), 12: ("Robot 72", 72),
+    40: ("Martin 2", 58), 44: ("Martin 1", 114),
+    56: ("Scottie 2", 71), 60: ("Scottie 1", 110), 76: ("Scottie DX", 269),
+    55: ("Wraase SC2-180", 182),
+    93: ("PD 50", 50), 99: ("PD 90", 90), 95: ("PD 120", 126), 98: ("PD 160", 161),
+    96: ("PD 180", 187), 97: ("PD 240", 248), 94: ("PD 290", 289),
+    113: ("Pasokon P3", 203), 114: ("Pasokon P5", 305), 115: ("Pasokon P7", 406),
+}
+
+
+def tone_shares(windows, sample_rate, tones=TONES):
+    """
+    Share of each window's energy at each tone, for `windows` of shape
+    (n, samples): 1.0 for a pure tone, as a (n, len(tones)) array.
+    """
+    n = windows.shape[1]
+    basis = np.exp(-2j * np.pi * np.outer(np.arange(n), tones) / sample_rate).astype(np.complex64)
+    power = np.abs(windows @ basis) ** 2
+    energy = np.einsum("ij,ij->i", windows, windows) * (n / 2)
+    return power / np.maximum(energy, 1e-9)[:, None]
+
+
+class VisDetector:
+    """
+    Tap callable fn(chunk, offset) that finds VIS headers in s16 mono
+    audio as it streams. Events go to `on_event(event)` (called on the
+    writer's thread) and are kept in `events`.
+    """
+
+    def __init__(self, sample_rate, on_event=None):
+        self.sample_rate = sample_rate
+        self.on_event = on_event
+        self.events = []
+        self.samples = 0                      # samples seen so far
+        self._bin = int(sample_rate * BIN_S)
+        self._bit = int(sample_rate * BIT_S)
+        self._history = np.zeros(0, np.float32)
+        self._history_start = 0               # sample offset of _history[0]
+        self._next_bin = 0                    # sample offset of the next unlabelled bin
+        self._pending = []                    # start-bit edges waiting for their bits
+        self._quiet_until = 0                 # no new headers inside an image being sent
+        self._reset()
+
+    def _reset(self):
+        self._leader = 0                      # 1900 Hz bins in the current run
+        self._low = 0                         # 1200 Hz bins after it
+        self._low_start = None
+        self._miss = 0
+
+    def __call__(self, chunk, offset):
+        if offset != self.samples:
+            # A gap in the stream: whatever was half-seen is gone
+            self._history = np.zeros(0, np.float32)
+            self._history_start = self._next_bin = offset
+            self._pending = []
+            self._reset()
+        x = np.frombuffer(chunk, dtype="<i2").astype(np.float32)
+        self._history = np.concatenate((self._history, x))
+        self.samples = offset + len(x)
+
+        self._label_bins()
+        self._decode_pending()
+
+        keep_from = self.samples - int(HISTORY_S * self.sample_rate)
+        if self._pending:
+            keep_from = min(keep_from, self._pending[0] - 2 * self._bin)
+        keep_from = min(max(keep_from, self._history_start), self._next_bin)
+        self._history = self._history[keep_from - self._history_start:]
+        self._history_start = keep_from
+
+    def _window(self, start, length):
+        i = start - self._history_start
+        return self._history[i:i + length]
+
+    def _label_bins(self):
+        n = (self.samples - self._next_bin) // self._bin
+        if n <= 0:
+            return
+        start = self._next_bin - self._history_start
+        bins = self._history[start:start + n * self._bin].reshape(n, self._bin)
+        shares = tone_shares(bins, self.sample_rate)
+        best = shares.argmax(axis=1)
+        top, second = np.sort(shares, axis=1)[:, :-3:-1].T
+        clear = (top >= TONE_SHARE) & (top >= TONE_DOMINANCE * second)
+        labels = np.where(clear, np.asarray(TONES)[best], 0)
+        leader_min = int(LEADER_MIN_S / BIN_S)
+        for k, label in enumerate(labels):
+            pos = self._next_bin + k * self._bin
+            if label == 1900:
+                self._leader += 1
+                self._low = self._miss = 0
+            elif label == 1200 and self._leader >= leader_min:
+                if not self._low:
+                    self._low_start = pos
+                self._low += 1
+                self._miss = 0
+                if self._low * BIN_S >= 2 * BREAK_S and pos >= self._quiet_until:
+                    self._pending.append(self._refine_edge(self._low_start))
+                    self._reset()
+            elif self._leader and not self._miss:
+                self._miss = 1  # one bin straddling a tone change
+            else:
+                self._reset()
+        self._next_bin += n * self._bin
+
+    def _refine_edge(self, coarse):
+        """The 1900 -> 1200 Hz edge near `coarse`: best split of 1900 before and 1200 after, 1 ms steps."""
+        step = max(1, self.sample_rate // 1000)
+        lo = max(coarse - self._bin, self._history_start + self._bin)
+        hi = min(coarse + self._bin, self.samples - self._bin)
+        candidates = np.arange(lo, hi + 1, step)
+        if not len(candidates):
+            return coarse
+        before = np.stack([self._window(p - self._bin, self._bin) for p in candidates])
+        after = np.stack([self._window(p, self._bin) for p in candidates])
+        score = tone_shares(before, self.sample_rate)[:, 3] + tone_shares(after, self.sample_rate)[:, 1]
+        return int(candidates[score.argmax()])
+
+    def _decode_pending(self):
+        header_bits = 10  # start, 7 data, parity, stop
+        while self._pending and self._pending[0] + header_bits * self._bit + self._bin <= self.samples:
+            edge = self._pending.pop(0)
+            event = self._decode(edge)
+            if event is None:
+                continue
+            self._pending = []
+            self._quiet_until = event["offset"] + int(0.9 * event["duration_s"] * self.sample_rate)
+            self.events.append(event)
+            if self.on_event:
+                self.on_event(event)
+
+    def _decode(self, edge):
+        """Measure the bits after a start-bit edge; an event dict, or None if it is not a VIS header."""
+        width = int(0.020 * self.sample_rate)
+        centres = edge + ((np.arange(1, 10) + 0.5) * self._bit).astype(int)
+        windows = np.stack([self._window(c - width // 2, width) for c in centres])
+        shares = tone_shares(windows, self.sample_rate)
+        data, stop = shares[:8], shares[8]
+        ones = data[:, 0] > data[:, 2]
+        bit = np.maximum(data[:, 0], data[:, 2])
+        other = np.maximum(np.minimum(data[:, 0], data[:, 2]), np.maximum(data[:, 1], data[:, 3]))
+        if (bit < TONE_SHARE).any() or (bit < TONE_DOMINANCE * other).any() or stop.argmax() != 1:
+            return None
+        if ones.sum() % 2:
+            return None  # even parity over data + parity bit
+        code = int(sum(1 << i for i in range(7) if ones[i]))
+        if code not in VIS_MODES:
+            return None
+        mode, duration = VIS_MODES[code]
+        start = edge + 10 * self._bit
+        header = max(0, edge - int((2 * LEADER_S + BREAK_S) * self.sample_rate))
+        return {"mode": mode, "vis": code, "t": round(start / self.sample_rate, 2),
+                "offset": start, "header_offset": header, "duration_s": duration}
@@ -0,0 +1,158 @@
+"""
+waterfall.py — incremental STFT waterfall (spectrogram) images.
+
+Waterfall is a capture_writer tap: each chunk of s16 mono audio is cut
+into Hann-windowed frames, transformed with one rfft call and added into
+a fixed-size buffer of MAX_COLUMNS time columns. When the buffer is
+full, neighbouring columns are merged pairwise and each column covers
+twice as many frames from then on, so memory stays the same however long
+the capture runs. save() renders the PNG (time left to right, frequency
+up, as `sox spectrogram` did), optionally with tiles, without reading
+the recording again.
+
+Existing WAVs are rendered in bounded memory by streaming them through
+the same tap:
+
+    python -m app.utils.waterfall recordings/<base>.wav recordings/<base>.png
+"""
+
+import argparse
+from pathlib import Path
+import wave
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+FFT_SIZE = 512            # 257 frequency rows; 94 Hz per row at 48 kHz
+HOP = 256
+MAX_COLUMNS = 2048        # the buffer: MAX_COLUMNS x (FFT_SIZE/2 + 1) float64
+FRAMES_PER_COLUMN = 4     # starting time resolution (~21 ms per column at 48 kHz)
+DYNAMIC_RANGE_DB = 90
+TILE_WIDTH = 256
+READ_FRAMES = 1 << 17     # WAV frames per block when rendering offline
+
+# Black -> blue -> magenta -> red -> yellow -> white, like sox's palette
+PALETTE = [(0.0, (0, 0, 0)), (0.2, (0, 0, 140)), (0.4, (140, 0, 160)),
+           (0.6, (230, 20, 20)), (0.8, (255, 200, 0)), (1.0, (255, 255, 255))]
+
+
+def _lut():
+    stops = [s for s, _ in PALETTE]
+    levels = np.linspace(0, 1, 256)
+    return np.stack([np.interp(levels, stops, [c[i] for _, c in PALETTE]) for i in range(3)],
+                    axis=1).astype(np.uint8)
+
+
+class Waterfall:
+    """Tap callable fn(chunk, offset) accumulating a waterfall of s16 mono audio."""
+
+    def __init__(self, sample_rate, fft_size=FFT_SIZE, hop=HOP, max_columns=MAX_COLUMNS,
+                 frames_per_column=FRAMES_PER_COLUMN):
+        self.sample_rate = sample_rate
+        self.fft_size = fft_size
+        self.hop = hop
+        self.max_columns = max_columns
+        self.frames_per_column = frames_per_column
+        self.frames = 0                   # STFT frames accumulated
+        self._window = np.hanning(fft_size).astype(np.float32)
+        self._sum = np.zeros((max_columns, fft_size // 2 + 1))
+        self._count = np.zeros(max_columns, dtype=np.int64)
+        self._carry = np.zeros(0, np.float32)
+
+    def __call__(self, chunk, offset):
+        x = np.concatenate((self._carry, np.frombuffer(chunk, dtype="<i2").astype(np.float32)))
+        n = (len(x) - self.fft_size) // self.hop + 1 if len(x) >= self.fft_size else 0
+        if n:
+            frames = sliding_window_view(x, self.fft_size)[:n * self.hop:self.hop] * self._window
+            self._accumulate(np.abs(np.fft.rfft(frames, axis=1)) ** 2)
+        self._carry = x[n * self.hop:]
+
+    def _accumulate(self, power):
+        while len(power):
+            room = self.max_columns * self.frames_per_column - self.frames
+            if room <= 0:
+                self._merge()
+                continue
+            take, power = power[:room], power[room:]
+            cols = (self.frames + np.arange(len(take))) // self.frames_per_column
+            starts = np.r_[0, np.flatnonzero(np.diff(cols)) + 1]
+            self._sum[cols[starts]] += np.add.reduceat(take, starts, axis=0)
+            self._count[cols[starts]] += np.diff(np.r_[starts, len(take)])
+            self.frames += len(take)
+
+    def _merge(self):
+        """Halve the time resolution: columns 2k and 2k+1 become column k."""
+        half = self.max_columns // 2
+        self._sum[:half] = self._sum[0::2] + self._sum[1::2]
+        self._sum[half:] = 0
+        self._count[:half] = self._count[0::2] + self._count[1::2]
+        self._count[half:] = 0
+        self.frames_per_column *= 2
+
+    @property
+    def seconds_per_column(self):
+        return self.frames_per_column * self.hop / self.sample_rate
+
+    def image(self):
+        """The waterfall as an RGB PIL image, or None before the first full frame."""
+        used = int(np.count_nonzero(self._count))
+        if not used:
+            return None
+        power = self._sum[:used] / self._count[:used, None]
+        db = 10 * np.log10(power + 1e-12)
+        top = db.max()
+        levels = np.clip((db - (top - DYNAMIC_RANGE_DB)) / DYNAMIC_RANGE_DB, 0, 1)
+        rgb = _lut()[(levels * 255).astype(np.uint8)]
+        return Image.fromarray(np.ascontiguousarray(rgb.transpose(1, 0, 2)[::-1]), "RGB")
+
+    def save(self, png_path, tiles_dir=None, tile_width=TILE_WIDTH):
+        """
+        Write the PNG and, with `tiles_dir`, the same image cut into
+        tile_width-column strips (000.png, 001.png, ... in time order).
+        Returns the PNG path, or None if no audio was seen.
+        """
+        img = self.image()
+        if img is None:
+            return None
+        img.save(png_path)
+        if tiles_dir:
+            tiles_dir = Path(tiles_dir)
+            tiles_dir.mkdir(parents=True, exist_ok=True)
+            for i, x in enumerate(range(0, img.width, tile_width)):
+                img.crop((x, 0, min(x + tile_width, img.width), img.height)).save(tiles_dir / f"{i:03d}.png")
+        return Path(png_path)
+
+
+def render_wav(wav_path, png_path=None, tiles_dir=None):
+    """Waterfall of an existing 16-bit WAV (default: PNG next to it), streamed block by block."""
+    wav_path = Path(wav_path)
+    png_path = Path(png_path) if png_path else wav_path.with_suffix(".png")
+    with wave.open(str(wav_path), "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{wav_path.name}: only 16-bit PCM WAVs are supported")
+        channels = w.getnchannels()
+        waterfall = Waterfall(w.getframerate())
+        offset = 0
+        while True:
+            block = w.readframes(READ_FRAMES)
+            if not block:
+                break
+            if channels > 1:
+                block = np.frombuffer(block, "<i2")[::channels].tobytes()  # first channel
+            waterfall(block, offset)
+            offset += len(block) // 2
+    return waterfall.save(png_path, tiles_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a waterfall PNG of a WAV recording.")
+    parser.add_argument("wav")
+    parser.add_argument("png", nargs="?")
+    parser.add_argument("--tiles", help="also write tiles into this directory")
+    args = parser.parse_args(argv)
+    print(render_wav(args.wav, args.png, args.tiles))
+
+
+if __name__ == "__main__":
+    main()